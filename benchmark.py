@@ -0,0 +1,75 @@
+import os
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+from multiprocessing import cpu_count
+from PySide6.QtCore import QCoreApplication
+from core.log_processor import LogProcessor
+
+LEVELS = ['INFO', 'INFO', 'INFO', 'DEBUG', 'WARNING', 'ERROR']
+
+def generate_logs(folder, files, total_mb):
+    # One large file plus many small ones: the skew that used to serialise the run
+    rng = random.Random(42)
+    sizes = [total_mb * 1024 * 1024 // 2]
+    sizes += [total_mb * 1024 * 1024 // 2 // max(1, files - 1)] * (files - 1)
+    for index, size in enumerate(sizes):
+        path = os.path.join(folder, f"service_{index}.log")
+        with open(path, 'w', encoding='utf-8') as f:
+            written = 0
+            while written < size:
+                line = (f"2024-01-01 12:00:{rng.randint(0, 59):02d} {rng.choice(LEVELS)} "
+                        f"worker-{rng.randint(1, 16)} request {rng.randint(1, 10 ** 6)} handled in {rng.randint(1, 999)} ms\n")
+                f.write(line)
+                written += len(line)
+
+def run_once(folder, workers):
+    processor = LogProcessor(folder, incremental=False, num_processes=workers)
+    result = {}
+    processor.finished.connect(lambda logs: result.setdefault('logs', logs))
+    processor.error.connect(lambda message: result.setdefault('error', message))
+    started = time.perf_counter()
+    processor.run()
+    elapsed = time.perf_counter() - started
+    if 'error' in result:
+        raise RuntimeError(result['error'])
+    logs = result['logs']
+    lines = logs.line_count if hasattr(logs, 'line_count') else logs.count('\n') + 1
+    if hasattr(logs, 'close'):
+        logs.close()
+    return elapsed, lines
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure LogProcessor scaling with the number of worker processes")
+    parser.add_argument('--files', type=int, default=32, help="number of generated log files")
+    parser.add_argument('--size-mb', type=int, default=256, help="total size of generated logs")
+    parser.add_argument('--max-workers', type=int, default=cpu_count(), help="largest pool size to measure")
+    parser.add_argument('--folder', help="existing log folder to use instead of generated logs")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    app = QCoreApplication([])
+    folder = args.folder or tempfile.mkdtemp(prefix="log_benchmark_")
+    try:
+        if not args.folder:
+            print(f"Generating {args.size_mb} MB of logs in {args.files} files...")
+            generate_logs(folder, args.files, args.size_mb)
+        workers = 1
+        baseline = None
+        while True:
+            elapsed, lines = run_once(folder, workers)
+            baseline = baseline or elapsed
+            print(f"workers={workers:3d}  time={elapsed:8.2f}s  lines={lines}  speedup={baseline / elapsed:5.2f}x")
+            if workers >= args.max_workers:
+                break
+            workers = min(workers * 2, args.max_workers)
+    finally:
+        if not args.folder:
+            shutil.rmtree(folder, ignore_errors=True)
+    del app
+
+if __name__ == '__main__':
+    main()
@@ -12,8 +12,38 @@ SUPPORTED_EXTENSIONS = {
     '.err', '.debug', '.trace', '.audit', '.syslog'
 }
 
+# Форматы, где каждая строка — самостоятельная запись: их можно дочитывать с любого смещения
+APPENDABLE_EXTENSIONS = {
+    '.log', '.txt', '.json', '.jsonl', '.out', '.err',
+    '.debug', '.trace', '.audit', '.syslog'
+}
+
 # Поддерживаемые архивы
 SUPPORTED_ARCHIVES = {'.zip', '.gz', '.tar', '.rar'}
 
 # Настройки среды
-os.environ['KMP_DUPLICATE_LIB_OK'] = 'TRUE' 
\ No newline at end of file
+os.environ['KMP_DUPLICATE_LIB_OK'] = 'TRUE'
+
+# Потоковая обработка: размер порции строк и потолок памяти по умолчанию
+DEFAULT_STREAM_CHUNK_KB = 1024
+DEFAULT_MEMORY_LIMIT_MB = 512
+# Построчные файлы крупнее этого размера разбираются параллельно по частям
+DEFAULT_SPLIT_MB = 64
+
+
+def get_env_int(name, default):
+    """Целое значение из переменной окружения с откатом на значение по умолчанию"""
+    value = os.getenv(name, '')
+    try:
+        return int(value) if value.strip() else default
+    except ValueError:
+        logger.warning(f"Некорректное значение {name}={value!r}, используется {default}")
+        return default
+
+
+def get_env_bool(name, default):
+    """Логическое значение из переменной окружения"""
+    value = os.getenv(name, '').strip().lower()
+    if not value:
+        return default
+    return value in {'1', 'true', 'yes', 'on'}
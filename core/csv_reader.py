@@ -0,0 +1,205 @@
+import io
+import re
+import csv
+import numpy as np
+
+SNIFF_CHARS = 64 * 1024
+ROLE_SAMPLE_ROWS = 100
+# Строки разбираются блоками: столбцы времени и уровня приводятся к типам целиком
+BLOCK_ROWS = 4096
+
+TIMESTAMP_NAMES = re.compile(r'^@?(timestamp|time|date|datetime|ts|time_?generated|created(_at)?|logged(_at)?)$', re.IGNORECASE)
+LEVEL_NAMES = re.compile(r'^(level|log_?level|severity|priority|lvl)$', re.IGNORECASE)
+MESSAGE_NAMES = re.compile(r'^(message|msg|text|description|details?|event)$', re.IGNORECASE)
+TIMESTAMP_VALUE = re.compile(r'^\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}')
+LEVEL_VALUES = {
+    'TRACE', 'DEBUG', 'INFO', 'NOTICE', 'WARN', 'WARNING', 'ERROR', 'ERR',
+    'CRITICAL', 'CRIT', 'FATAL', 'ALERT', 'EMERG', 'EMERGENCY'
+}
+# Синонимы уровней и числовые уровни syslog (RFC 5424) приводятся к одному имени
+LEVEL_ALIASES = {
+    'WARN': 'WARNING', 'ERR': 'ERROR', 'CRIT': 'CRITICAL', 'EMERG': 'EMERGENCY',
+    '0': 'EMERGENCY', '1': 'ALERT', '2': 'CRITICAL', '3': 'ERROR',
+    '4': 'WARNING', '5': 'NOTICE', '6': 'INFO', '7': 'DEBUG'
+}
+ISO_PATTERN = r'^(\d{4}-\d{2}-\d{2})[T ](\d{2}:\d{2}(?::\d{2})?)(?:[.,]\d+)?[ \t]*(Z|[+-]\d{2}:?\d{2})?$'
+ISO_TIMESTAMP = re.compile(ISO_PATTERN, re.IGNORECASE)
+ISO_COLUMN = re.compile(ISO_PATTERN, re.IGNORECASE | re.MULTILINE)
+# Unix-время в секундах или миллисекундах (с 2001 года)
+EPOCH_TIMESTAMP = re.compile(r'^\d{10}(?:\d{3})?(?:\.\d+)?$')
+EPOCH_MS_THRESHOLD = 10 ** 11
+
+DELIMITERS = ',;\t|'
+
+def sniff_dialect(sample):
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=DELIMITERS)
+    except csv.Error:
+        # Sniffer не справляется с многострочными полями: берём самый частый разделитель заголовка
+        header = sample.split('\n', 1)[0]
+        delimiter = max(DELIMITERS, key=header.count)
+        return type('HeaderDialect', (csv.excel,), {'delimiter': delimiter})
+
+def infer_roles(header, rows):
+    # Столбцы времени и уровня ищутся сначала по именам, затем по значениям первых строк
+    timestamp = None
+    level = None
+    for index, name in enumerate(header):
+        name = name.strip()
+        if timestamp is None and TIMESTAMP_NAMES.match(name):
+            timestamp = index
+        elif level is None and LEVEL_NAMES.match(name):
+            level = index
+    for index in range(len(header)):
+        if index in {timestamp, level}:
+            continue
+        values = [row[index].strip() for row in rows if row[index].strip()]
+        if not values:
+            continue
+        if timestamp is None and all(TIMESTAMP_VALUE.match(value) for value in values):
+            timestamp = index
+        elif level is None and all(value.upper() in LEVEL_VALUES for value in values):
+            level = index
+    return timestamp, level
+
+def infer_message(header, rows, taken):
+    # Текст события: столбец с подходящим именем, иначе самый длинный по первым строкам
+    candidates = [index for index in range(len(header)) if index not in taken]
+    for index in candidates:
+        if MESSAGE_NAMES.match(header[index].strip()):
+            return index
+    lengths = {index: sum(len(row[index]) for row in rows) for index in candidates}
+    return max(lengths, key=lengths.get) if lengths and max(lengths.values()) else None
+
+def zone_offset(zone):
+    # Смещение зоны в секундах; Z и отсутствие зоны — ноль
+    if not zone or zone.upper() == 'Z':
+        return 0
+    zone = zone.replace(':', '')
+    return (int(zone[1:3]) * 3600 + int(zone[3:5]) * 60) * (-1 if zone[0] == '-' else 1)
+
+def parse_timestamps(values):
+    # Столбец времени в datetime64: ISO 8601 со смещением и Unix-время приводятся
+    # к UTC (отмечены в utc), время без зоны остаётся как есть; нераспознанное — NaT
+    values = [value.strip() for value in values]
+    result = np.full(len(values), np.datetime64('NaT'), dtype='datetime64[s]')
+    utc = np.zeros(len(values), dtype=bool)
+    joined = "\n".join(values)
+    matches = ISO_COLUMN.findall(joined)
+    if len(matches) == len(values) and joined.count("\n") == len(values) - 1:
+        # Обычный случай: весь блок в ISO 8601 — одно регулярное выражение на столбец
+        iso_index = range(len(values))
+    else:
+        iso_index, matches = [], []
+        for index, value in enumerate(values):
+            match = ISO_TIMESTAMP.match(value)
+            if match:
+                iso_index.append(index)
+                matches.append(match.groups(''))
+    epoch_index = [index for index, value in enumerate(values)
+                   if EPOCH_TIMESTAMP.match(value)] if len(matches) < len(values) else []
+    if matches:
+        stamps = np.array([f"{date}T{time}" for date, time, _ in matches])
+        zones = [zone for _, _, zone in matches]
+        offsets = np.array([zone_offset(zone) for zone in zones], dtype='timedelta64[s]')
+        utc[iso_index] = np.array(zones, dtype=object) != ''
+        try:
+            result[iso_index] = stamps.astype('datetime64[s]') - offsets
+        except ValueError:
+            # Несуществующая дата в блоке: разбираем значения по одному
+            for index, stamp, offset in zip(iso_index, stamps, offsets):
+                try:
+                    result[index] = np.datetime64(stamp, 's') - offset
+                except ValueError:
+                    pass
+    if epoch_index:
+        numbers = np.array([float(values[index]) for index in epoch_index])
+        numbers = np.where(numbers >= EPOCH_MS_THRESHOLD, numbers / 1000, numbers)
+        result[epoch_index] = numbers.astype(np.int64).astype('datetime64[s]')
+        utc[epoch_index] = True
+    return result, utc
+
+def normalize_level(value):
+    value = value.strip()
+    name = value.upper()
+    return LEVEL_ALIASES.get(name, name if name in LEVEL_VALUES else value)
+
+class CsvReader:
+    """Потоковое чтение CSV-лога модулем csv.
+
+    Разделитель и кавычки определяются по началу файла, поля в кавычках
+    с запятыми и переводами строк разбираются корректно. Строки
+    приводятся к числу столбцов заголовка. Столбцы времени, уровня
+    и текста события определяются по заголовку и первым строкам;
+    время и уровень приводятся к типам поблочно.
+    """
+
+    def __init__(self, f):
+        sample = f.read(SNIFF_CHARS)
+        # Дочитываем строку до конца, чтобы выборка не обрывалась посреди записи
+        sample += f.readline()
+        self.dialect = sniff_dialect(sample)
+        self._reader = csv.reader(self._lines(io.StringIO(sample, newline=''), f), self.dialect)
+        self.header = [name.strip() for name in next(self._reader, [])]
+        self._head = []
+        for row in self._reader:
+            if any(value.strip() for value in row):
+                self._head.append(self._normalize(row))
+            if len(self._head) >= ROLE_SAMPLE_ROWS:
+                break
+        self.timestamp, self.level = infer_roles(self.header, self._head)
+        self.message = infer_message(self.header, self._head, {self.timestamp, self.level})
+        order = [index for index in (self.timestamp, self.level, self.message) if index is not None]
+        order += [index for index in range(len(self.header)) if index not in order]
+        self._order = [(index, self.header[index]) for index in order]
+
+    @staticmethod
+    def _lines(head, rest):
+        yield from head
+        yield from rest
+
+    def _normalize(self, row):
+        width = len(self.header)
+        if len(row) < width:
+            return row + [''] * (width - len(row))
+        return row[:width]
+
+    def __iter__(self):
+        yield from self._head
+        self._head = []
+        for row in self._reader:
+            if any(value.strip() for value in row):
+                yield self._normalize(row)
+
+    def iter_records(self, block_rows=BLOCK_ROWS):
+        block = []
+        for row in self:
+            block.append(row)
+            if len(block) >= block_rows:
+                yield from self.format_block(block)
+                block = []
+        if block:
+            yield from self.format_block(block)
+
+    def format_block(self, rows):
+        # Время в ISO 8601 и каноническое имя уровня; нераспознанное значение
+        # остаётся как есть
+        if self.timestamp is not None:
+            values = [row[self.timestamp] for row in rows]
+            times, utc = parse_timestamps(values)
+            text = np.char.add(np.datetime_as_string(times, unit='s'), np.where(utc, 'Z', ''))
+            for row, value in zip(rows, np.where(np.isnat(times), values, text).tolist()):
+                row[self.timestamp] = value
+        if self.level is not None:
+            levels = {}
+            for row in rows:
+                value = row[self.level]
+                level = levels.get(value)
+                if level is None:
+                    level = levels[value] = normalize_level(value)
+                row[self.level] = level
+        return [self.format_row(row) for row in rows]
+
+    def format_row(self, row):
+        # Время, уровень и текст события ставятся в начало записи
+        return " | ".join([f"{name}: {row[index].strip()}" for index, name in self._order])
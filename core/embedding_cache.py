@@ -0,0 +1,132 @@
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+from core.constants import logger
+
+DEFAULT_EMBED_CACHE_SIZE = 50000
+
+class EmbeddingCache:
+    """Постоянный кэш эмбеддингов по хэшу текста.
+
+    Векторы лежат в memory-mapped массиве float32 фиксированной ёмкости,
+    индекс «хэш -> слот» хранится в JSON. При заполнении вытесняются слоты,
+    к которым дольше всего не обращались (LRU).
+    """
+
+    def __init__(self, directory, dimension, model_name, capacity=DEFAULT_EMBED_CACHE_SIZE):
+        self.directory = directory
+        self.dimension = dimension
+        self.model_name = model_name
+        self.capacity = max(1, capacity)
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._last_used = {}
+        self._free = []
+        self._clock = 0
+        self._dirty = False
+        os.makedirs(self.directory, exist_ok=True)
+        self._vectors_path = os.path.join(self.directory, "embeddings.f32")
+        self._index_path = os.path.join(self.directory, "embeddings_index.json")
+        self._load()
+
+    def _load(self):
+        index = None
+        if os.path.exists(self._index_path):
+            try:
+                with open(self._index_path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+            except Exception as e:
+                logger.warning(f"Индекс кэша эмбеддингов повреждён, кэш будет очищен: {e}")
+
+        expected_size = self.capacity * self.dimension * 4
+        compatible = (
+            index is not None
+            and index.get("model") == self.model_name
+            and index.get("dimension") == self.dimension
+            and index.get("capacity") == self.capacity
+            and os.path.exists(self._vectors_path)
+            and os.path.getsize(self._vectors_path) == expected_size
+        )
+        if compatible:
+            for key, (slot, last_used) in index["entries"].items():
+                self._slots[key] = slot
+                self._last_used[key] = last_used
+            self._clock = index.get("clock", 0)
+            mode = 'r+'
+        else:
+            mode = 'w+'
+        used = set(self._slots.values())
+        self._free = [slot for slot in range(self.capacity - 1, -1, -1) if slot not in used]
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode=mode,
+                                  shape=(self.capacity, self.dimension))
+        logger.debug(f"Кэш эмбеддингов: {len(self._slots)} из {self.capacity} записей")
+
+    def key(self, text):
+        # Модель входит в ключ косвенно: при её смене кэш сбрасывается целиком
+        return hashlib.sha1(text.encode('utf-8', errors='replace')).hexdigest()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                slot = self._slots.get(key)
+                if slot is None or key in found:
+                    continue
+                self._clock += 1
+                self._last_used[key] = self._clock
+                found[key] = np.array(self._vectors[slot])
+            if found:
+                self._dirty = True
+        return found
+
+    def put_many(self, keys, vectors):
+        with self._lock:
+            new_keys = [key for key in dict.fromkeys(keys) if key not in self._slots]
+            free = self._free_slots(min(len(new_keys), self.capacity))
+            for key, vector in zip(keys, vectors):
+                slot = self._slots.get(key)
+                if slot is None:
+                    if not free:
+                        continue
+                    slot = free.pop()
+                    self._slots[key] = slot
+                self._clock += 1
+                self._last_used[key] = self._clock
+                self._vectors[slot] = vector
+            self._free.extend(free)
+            self._dirty = True
+            self._flush()
+
+    def _free_slots(self, needed):
+        free = []
+        while self._free and len(free) < needed:
+            free.append(self._free.pop())
+        if len(free) < needed:
+            # Вытесняем давно не использованные записи
+            victims = sorted(self._slots, key=self._last_used.get)[:needed - len(free)]
+            for key in victims:
+                free.append(self._slots.pop(key))
+                del self._last_used[key]
+        return free
+
+    def _flush(self):
+        if not self._dirty:
+            return
+        self._vectors.flush()
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "model": self.model_name,
+                "dimension": self.dimension,
+                "capacity": self.capacity,
+                "clock": self._clock,
+                "entries": {key: [slot, self._last_used[key]] for key, slot in self._slots.items()}
+            }, f)
+        os.replace(tmp_path, self._index_path)
+        self._dirty = False
+
+    def flush(self):
+        with self._lock:
+            self._flush()
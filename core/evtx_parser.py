@@ -0,0 +1,367 @@
+import struct
+import uuid
+import datetime
+import xml.etree.ElementTree as ET
+from core.constants import logger
+
+# Формат EVTX: заголовок файла 4 КБ, далее независимые чанки по 64 КБ.
+# У каждого чанка свои таблицы имён и шаблонов, поэтому чанки можно разбирать
+# по отдельности и параллельно
+FILE_HEADER_SIZE = 4096
+CHUNK_SIZE = 64 * 1024
+CHUNK_HEADER_SIZE = 512
+FILE_MAGIC = b'ElfFile\x00'
+CHUNK_MAGIC = b'ElfChnk\x00'
+RECORD_MAGIC = b'\x2a\x2a\x00\x00'
+RECORD_HEADER_SIZE = 24
+
+# Токены двоичного XML; флаг 0x40 означает «есть атрибуты» или «далее продолжение»
+TOKEN_EOF = 0x00
+TOKEN_OPEN_START_ELEMENT = 0x01
+TOKEN_CLOSE_START_ELEMENT = 0x02
+TOKEN_CLOSE_EMPTY_ELEMENT = 0x03
+TOKEN_END_ELEMENT = 0x04
+TOKEN_VALUE = 0x05
+TOKEN_ATTRIBUTE = 0x06
+TOKEN_CDATA = 0x07
+TOKEN_CHAR_REF = 0x08
+TOKEN_ENTITY_REF = 0x09
+TOKEN_PI_TARGET = 0x0A
+TOKEN_PI_DATA = 0x0B
+TOKEN_TEMPLATE_INSTANCE = 0x0C
+TOKEN_NORMAL_SUBSTITUTION = 0x0D
+TOKEN_OPTIONAL_SUBSTITUTION = 0x0E
+TOKEN_FRAGMENT_HEADER = 0x0F
+
+VALUE_TOKENS = {TOKEN_VALUE, TOKEN_CHAR_REF, TOKEN_ENTITY_REF,
+                TOKEN_NORMAL_SUBSTITUTION, TOKEN_OPTIONAL_SUBSTITUTION}
+
+# Типы значений подстановок с фиксированным размером: формат struct
+NUMERIC_TYPES = {
+    0x03: 'b', 0x04: 'B', 0x05: 'h', 0x06: 'H', 0x07: 'i', 0x08: 'I',
+    0x09: 'q', 0x0A: 'Q', 0x0B: 'f', 0x0C: 'd'
+}
+TYPE_NULL = 0x00
+TYPE_STRING = 0x01
+TYPE_ANSI_STRING = 0x02
+TYPE_BOOL = 0x0D
+TYPE_BINARY = 0x0E
+TYPE_GUID = 0x0F
+TYPE_SIZE = 0x10
+TYPE_FILETIME = 0x11
+TYPE_SYSTEMTIME = 0x12
+TYPE_SID = 0x13
+TYPE_HEX32 = 0x14
+TYPE_HEX64 = 0x15
+TYPE_BINXML = 0x21
+TYPE_ARRAY = 0x80
+
+ENTITIES = {'amp': '&', 'lt': '<', 'gt': '>', 'quot': '"', 'apos': "'"}
+FILETIME_EPOCH = datetime.datetime(1601, 1, 1)
+
+def filetime_to_text(value):
+    if not value:
+        return ''
+    try:
+        return (FILETIME_EPOCH + datetime.timedelta(microseconds=value // 10)).isoformat(sep=' ')
+    except OverflowError:
+        return str(value)
+
+def local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+class EvtxChunk:
+    """Разбор одного чанка EVTX.
+
+    Записи событий хранятся двоичным XML: шаблон элемента описывается один
+    раз на чанк, а записи ссылаются на него и передают только значения
+    подстановок. Разобранные шаблоны кэшируются по смещению в чанке.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.names = {}
+        self.templates = {}
+
+    def _u16(self, pos):
+        return struct.unpack_from('<H', self.data, pos)[0]
+
+    def _u32(self, pos):
+        return struct.unpack_from('<I', self.data, pos)[0]
+
+    def _text(self, pos, chars):
+        return self.data[pos:pos + chars * 2].decode('utf-16-le', errors='replace')
+
+    def records(self):
+        data = self.data
+        # Смещение свободного места — конец последней записи чанка
+        end = min(self._u32(48) or CHUNK_SIZE, len(data))
+        pos = CHUNK_HEADER_SIZE
+        while pos + RECORD_HEADER_SIZE <= end and data[pos:pos + 4] == RECORD_MAGIC:
+            size = self._u32(pos + 4)
+            if size < RECORD_HEADER_SIZE + 4 or pos + size > len(data):
+                break
+            record_id, filetime = struct.unpack_from('<QQ', data, pos + 8)
+            try:
+                yield record_id, filetime, self.parse_record(pos + RECORD_HEADER_SIZE, pos + size - 4)
+            except (struct.error, IndexError, ValueError, UnicodeDecodeError) as e:
+                logger.warning(f"Не удалось разобрать запись журнала событий {record_id}: {e}")
+            pos += size
+
+    def parse_record(self, start, end):
+        nodes, _ = self._parse_nodes(start, end)
+        root = ET.Element('root')
+        self._build(nodes, [], root)
+        return root[0] if len(root) else None
+
+    def _name(self, pos):
+        # Ссылка на имя; если имя записано прямо за ссылкой, его нужно пропустить
+        offset = self._u32(pos)
+        pos += 4
+        name = self.names.get(offset)
+        length = self._u16(offset + 6)
+        if name is None:
+            name = self.names[offset] = self._text(offset + 8, length)
+        if offset == pos:
+            pos += 8 + length * 2 + 2
+        return name, pos
+
+    def _parse_nodes(self, pos, end):
+        # Содержимое до конца элемента или фрагмента.
+        # Узлы: ('element', имя, атрибуты, дети), строка, ('sub', индекс, необязательная),
+        # ('template', узлы шаблона, значения)
+        data = self.data
+        nodes = []
+        while pos < end:
+            token = data[pos] & 0x0F
+            if token in (TOKEN_EOF, TOKEN_END_ELEMENT):
+                return nodes, pos + 1
+            if token == TOKEN_FRAGMENT_HEADER:
+                pos += 4
+            elif token == TOKEN_OPEN_START_ELEMENT:
+                node, pos = self._parse_element(pos, end)
+                nodes.append(node)
+            elif token == TOKEN_TEMPLATE_INSTANCE:
+                node, pos = self._parse_template_instance(pos)
+                nodes.append(node)
+            elif token in (TOKEN_PI_TARGET, TOKEN_PI_DATA):
+                pos = self._skip_pi(pos)
+            else:
+                node, pos = self._parse_value(pos)
+                nodes.append(node)
+        return nodes, pos
+
+    def _parse_value(self, pos):
+        token = self.data[pos] & 0x0F
+        if token == TOKEN_VALUE:
+            # Тип значения всегда строка: длина в символах и UTF-16
+            length = self._u16(pos + 2)
+            return self._text(pos + 4, length), pos + 4 + length * 2
+        if token == TOKEN_CDATA:
+            length = self._u16(pos + 1)
+            return self._text(pos + 3, length), pos + 3 + length * 2
+        if token == TOKEN_CHAR_REF:
+            return chr(self._u16(pos + 1)), pos + 3
+        if token == TOKEN_ENTITY_REF:
+            name, pos = self._name(pos + 1)
+            return ENTITIES.get(name, f"&{name};"), pos
+        if token in (TOKEN_NORMAL_SUBSTITUTION, TOKEN_OPTIONAL_SUBSTITUTION):
+            return ('sub', self._u16(pos + 1), token == TOKEN_OPTIONAL_SUBSTITUTION), pos + 4
+        raise ValueError(f"неизвестный токен {self.data[pos]:#04x} по смещению {pos}")
+
+    def _skip_pi(self, pos):
+        if self.data[pos] & 0x0F == TOKEN_PI_TARGET:
+            _, pos = self._name(pos + 1)
+            return pos
+        return pos + 3 + self._u16(pos + 1) * 2
+
+    def _parse_element(self, pos, end):
+        has_attributes = self.data[pos] & 0x40
+        # Токен, идентификатор зависимости (2), размер элемента (4), ссылка на имя
+        name, pos = self._name(pos + 7)
+        attributes = []
+        if has_attributes:
+            pos += 4
+            while self.data[pos] & 0x0F == TOKEN_ATTRIBUTE:
+                attribute, pos = self._name(pos + 1)
+                parts = []
+                while self.data[pos] & 0x0F in VALUE_TOKENS:
+                    part, pos = self._parse_value(pos)
+                    parts.append(part)
+                attributes.append((attribute, parts))
+        token = self.data[pos] & 0x0F
+        pos += 1
+        children = []
+        if token == TOKEN_CLOSE_START_ELEMENT:
+            children, pos = self._parse_nodes(pos, end)
+        elif token != TOKEN_CLOSE_EMPTY_ELEMENT:
+            raise ValueError(f"неожиданный токен {token:#04x} после начала элемента {name}")
+        return ('element', name, attributes, children), pos
+
+    def _parse_template_instance(self, pos):
+        # Токен, неизвестный байт, идентификатор шаблона (4), смещение определения (4)
+        offset = self._u32(pos + 6)
+        pos += 10
+        template = self.templates.get(offset)
+        if template is None:
+            # Определение: следующее (4), GUID (16), размер данных (4), двоичный XML шаблона
+            size = self._u32(offset + 20)
+            template, _ = self._parse_nodes(offset + 24, offset + 24 + size)
+            self.templates[offset] = template
+        if offset == pos:
+            pos += 24 + self._u32(offset + 20)
+
+        count = self._u32(pos)
+        pos += 4
+        descriptors = [struct.unpack_from('<HB', self.data, pos + index * 4) for index in range(count)]
+        pos += count * 4
+        values = []
+        for size, value_type in descriptors:
+            values.append(self._decode_value(value_type, pos, size))
+            pos += size
+        return ('template', template, values), pos
+
+    def _decode_value(self, value_type, pos, size):
+        raw = self.data[pos:pos + size]
+        base = value_type & 0x7F
+        if value_type == TYPE_NULL or not size:
+            return None
+        if base == TYPE_BINXML:
+            nodes, _ = self._parse_nodes(pos, pos + size)
+            return ('nodes', nodes)
+        if base == TYPE_STRING:
+            text = raw.decode('utf-16-le', errors='replace')
+            return ", ".join(filter(None, text.split('\x00'))) if value_type & TYPE_ARRAY else text.rstrip('\x00')
+        if base == TYPE_ANSI_STRING:
+            return raw.decode('latin1').rstrip('\x00')
+        if value_type & TYPE_ARRAY:
+            item_size = {TYPE_GUID: 16, TYPE_SYSTEMTIME: 16, TYPE_FILETIME: 8, TYPE_HEX32: 4,
+                         TYPE_HEX64: 8, TYPE_BOOL: 4}.get(base)
+            if base in NUMERIC_TYPES:
+                item_size = struct.calcsize(NUMERIC_TYPES[base])
+            if not item_size:
+                return raw.hex()
+            return ", ".join(self._decode_value(base, pos + index, item_size)
+                             for index in range(0, size - size % item_size, item_size))
+        if base in NUMERIC_TYPES:
+            return str(struct.unpack_from('<' + NUMERIC_TYPES[base], raw)[0])
+        if base == TYPE_BOOL:
+            return 'true' if struct.unpack_from('<i', raw)[0] else 'false'
+        if base == TYPE_GUID:
+            return '{' + str(uuid.UUID(bytes_le=raw[:16])).upper() + '}'
+        if base == TYPE_SIZE or base in (TYPE_HEX32, TYPE_HEX64):
+            return hex(int.from_bytes(raw, 'little'))
+        if base == TYPE_FILETIME:
+            return filetime_to_text(struct.unpack_from('<Q', raw)[0])
+        if base == TYPE_SYSTEMTIME:
+            year, month, _, day, hour, minute, second, millis = struct.unpack_from('<8H', raw)
+            return f"{year:04d}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}:{second:02d}.{millis:03d}"
+        if base == TYPE_SID:
+            revision, count = raw[0], raw[1]
+            authority = int.from_bytes(raw[2:8], 'big')
+            subs = struct.unpack_from(f'<{count}I', raw, 8)
+            return f"S-{revision}-{authority}" + "".join(f"-{sub}" for sub in subs)
+        return raw.hex()
+
+    def _build(self, nodes, values, parent):
+        for node in nodes:
+            if isinstance(node, str):
+                self._append_text(parent, node)
+            elif node[0] == 'element':
+                _, name, attributes, children = node
+                element = ET.SubElement(parent, name)
+                for attribute, parts in attributes:
+                    texts = [self._substitute(part, values) for part in parts]
+                    if any(text is not None for text in texts):
+                        element.set(attribute, "".join(text for text in texts if isinstance(text, str)))
+                self._build(children, values, element)
+            elif node[0] == 'template':
+                self._build(node[1], node[2], parent)
+            else:
+                value = self._substitute(node, values)
+                if isinstance(value, tuple):
+                    self._build(value[1], [], parent)
+                elif value is not None:
+                    self._append_text(parent, value)
+
+    @staticmethod
+    def _substitute(part, values):
+        if isinstance(part, str):
+            return part
+        _, index, _ = part
+        return values[index] if index < len(values) else None
+
+    @staticmethod
+    def _append_text(parent, text):
+        if len(parent):
+            parent[-1].tail = (parent[-1].tail or '') + text
+        else:
+            parent.text = (parent.text or '') + text
+
+def chunk_offsets(file_size, start=0, end=None):
+    # Смещения чанков, начинающихся в диапазоне [start, end)
+    end = file_size if end is None else min(end, file_size)
+    first = max(0, (max(start, FILE_HEADER_SIZE) - FILE_HEADER_SIZE + CHUNK_SIZE - 1) // CHUNK_SIZE)
+    offset = FILE_HEADER_SIZE + first * CHUNK_SIZE
+    while offset < end:
+        yield offset
+        offset += CHUNK_SIZE
+
+def iter_evtx_records(f, start=0, end=None):
+    """Записи (номер, время FILETIME, элемент Event) из чанков в диапазоне [start, end).
+
+    f — двоичный поток с произвольным доступом. Заголовок файла не читается:
+    чанки без сигнатуры (ещё не заполненные) пропускаются.
+    """
+    f.seek(0, 2)
+    file_size = f.tell()
+    for offset in chunk_offsets(file_size, start, end):
+        f.seek(offset)
+        data = f.read(CHUNK_SIZE)
+        if len(data) < CHUNK_HEADER_SIZE or data[:8] != CHUNK_MAGIC:
+            continue
+        for record_id, filetime, event in EvtxChunk(data).records():
+            if event is not None:
+                yield record_id, filetime, event
+
+def is_evtx(f):
+    f.seek(0)
+    return f.read(len(FILE_MAGIC)) == FILE_MAGIC
+
+def format_event(record_id, filetime, event):
+    # Та же строка, что выдавал разбор через win32evtlog, плюс компьютер и номер записи
+    system = {}
+    data = []
+    for section in event:
+        section_name = local_name(section.tag)
+        if section_name == 'System':
+            for item in section:
+                system[local_name(item.tag)] = item
+        elif section_name in ('EventData', 'UserData'):
+            for item in section.iter():
+                if item is section or len(item):
+                    continue
+                value = (item.text or '').strip()
+                if not value:
+                    continue
+                name = item.get('Name') or (local_name(item.tag) if local_name(item.tag) != 'Data' else None)
+                data.append(f"{name}={value}" if name else value)
+
+    def text(name):
+        item = system.get(name)
+        return (item.text or '').strip() if item is not None else ''
+
+    provider = system.get('Provider')
+    source = provider.get('Name', '') if provider is not None else ''
+    created = system.get('TimeCreated')
+    time_text = created.get('SystemTime', '') if created is not None else ''
+    return (
+        f"EventID: {text('EventID')} | "
+        f"Time: {time_text or filetime_to_text(filetime)} | "
+        f"Source: {source} | "
+        f"Type: {text('Level')} | "
+        f"Category: {text('Task')} | "
+        f"Computer: {text('Computer')} | "
+        f"Record: {record_id} | "
+        f"Message: {' | '.join(data) or source}"
+    )
@@ -1,22 +1,397 @@
 import requests
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
 from PySide6.QtCore import QThread, Signal
-from core.constants import logger
-from core.prompts import DEFAULT_LOG_ANALYSIS_PROMPT
+from core.constants import logger, get_env_int, get_env_bool
+from core.prompts import DEFAULT_LOG_ANALYSIS_PROMPT, DEFAULT_MAP_PROMPT, DEFAULT_REDUCE_PROMPT, TEMPLATE_SUMMARY_HEADER, FILTERED_WINDOWS_HEADER
+from core.log_buffer import LogBuffer
+from core.llm_cache import ResponseCache
+from core.log_templates import TemplateMiner
+from core.log_filter import LogFilter
 from dotenv import load_dotenv
 import os
+import json
+import time
+import random
+import threading
+from requests.adapters import HTTPAdapter
+
+# Map-reduce анализ: бюджет фрагмента в токенах (оценка ~4 символа на токен),
+# предел числа фрагментов и число одновременных запросов к LLM
+CHARS_PER_TOKEN = 4
+DEFAULT_CHUNK_TOKENS = 1000
+DEFAULT_MAX_MAP_CHUNKS = 64
+DEFAULT_MAP_WORKERS = 4
+
+# HTTP-клиент: таймауты (сек), повторы с экспоненциальной задержкой
+# и предел одновременных запросов к серверу LLM
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 300
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_SECONDS = 1
+MAX_BACKOFF_SECONDS = 30
+DEFAULT_MAX_CONCURRENT_REQUESTS = 4
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Сессия и семафор общие для всех анализов: соединения переиспользуются
+# (keep-alive), а число одновременных запросов ограничено на всё приложение
+_http_session = None
+_request_slots = None
+_http_lock = threading.Lock()
+
+def get_http_client():
+    global _http_session, _request_slots
+    with _http_lock:
+        if _http_session is None:
+            max_concurrent = max(1, get_env_int('LLM_MAX_CONCURRENT', DEFAULT_MAX_CONCURRENT_REQUESTS))
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_concurrent)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _http_session = session
+            _request_slots = threading.BoundedSemaphore(max_concurrent)
+            logger.debug(f"Создана HTTP-сессия LLM, одновременных запросов: {max_concurrent}")
+        return _http_session, _request_slots
+
+def fit_lines(lines, max_chars):
+    # Начальные строки, которые вместе с переводами строк укладываются в max_chars
+    result = []
+    for line in lines:
+        max_chars -= len(line) + 1
+        if max_chars < 0:
+            break
+        result.append(line)
+    return result
 
 class LLMAnalyzer(QThread):
-    finished = Signal(str)
+    progress = Signal(str)
+    token = Signal(str)
+    # Второй аргумент — итоговый ответ взят из кэша и уже есть в базе
+    finished = Signal(str, bool)
     error = Signal(str)
     
     def __init__(self, api_url, api_key, log_text, vectorizer):
         super().__init__()
         self.api_url = api_url
         self.api_key = api_key
-        self.log_text = log_text
+        # Принимаем как готовую строку, так и потоковый буфер LogProcessor
+        if isinstance(log_text, LogBuffer):
+            self.logs = log_text
+        else:
+            self.logs = LogBuffer.from_text(log_text)
         self.vectorizer = vectorizer
+        self.stream = False
+        self.cache = None
+        self.from_cache = False
         logger.debug("Инициализация LLMAnalyzer")
         
+    def _api_endpoint(self):
+        # Коррекция URL
+        endpoint = "/v1/chat/completions"
+        if self.api_url.endswith(endpoint):
+            return self.api_url
+        elif self.api_url.endswith("/"):
+            return f"{self.api_url[:-1]}{endpoint}"
+        else:
+            return f"{self.api_url}{endpoint}"
+    
+    def _request_completion(self, prompt, stream=False, key_prompt=None, final=False):
+        headers = {
+            "Content-Type": "application/json"
+        }
+        
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        
+        data = {
+            "model": "default",
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": os.getenv('LLM_TEMPERATURE'),
+            "max_tokens": os.getenv('LLM_MAX_TOKENS')
+        }
+        if stream:
+            data["stream"] = True
+        
+        api_url = self._api_endpoint()
+        
+        # Промпт уже содержит шаблон и логи, поэтому вместе с параметрами
+        # генерации он однозначно определяет ответ; key_prompt заменяет его в ключе
+        cache_key = None
+        if self.cache is not None:
+            cache_key = ResponseCache.make_key(
+                url=api_url,
+                model=data["model"],
+                temperature=data["temperature"],
+                max_tokens=data["max_tokens"],
+                prompt=key_prompt if key_prompt is not None else prompt
+            )
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.debug(f"Ответ взят из кэша: {cache_key[:12]}")
+                if final:
+                    self.from_cache = True
+                if stream:
+                    self.token.emit(cached)
+                return cached
+        
+        logger.debug(f"Отправка запроса на URL: {api_url}")
+        logger.debug(f"Длина запроса: {len(prompt)} символов")
+        
+        session, slots = get_http_client()
+        # Слот удерживается до конца чтения ответа, включая потоковый
+        with slots:
+            response = self._post_with_retries(session, api_url, headers, data, stream)
+            
+            # Сервер может проигнорировать stream и вернуть обычный JSON
+            if stream and response.headers.get('Content-Type', '').startswith('text/event-stream'):
+                analysis = self._read_event_stream(response)
+            else:
+                result = response.json()
+                logger.debug(f"Получен ответ API: {str(result)[:200]}...")
+                analysis = self._extract_content(result)
+        
+        if cache_key is not None and analysis:
+            self.cache.put(cache_key, analysis)
+        return analysis
+    
+    def _final_completion(self, template, **parts):
+        # Похожие записи из базы меняются по мере её роста и в ключ кэша не входят:
+        # ответ по тем же логам берётся из кэша, даже если в базе появились новые записи
+        prompt = template.format(**parts)
+        key_prompt = template.format(**dict(parts, similar_logs=""))
+        return self._request_completion(prompt, stream=self.stream, key_prompt=key_prompt, final=True)
+    
+    def _post_with_retries(self, session, api_url, headers, data, stream):
+        timeout = (
+            get_env_int('LLM_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT),
+            get_env_int('LLM_READ_TIMEOUT', DEFAULT_READ_TIMEOUT)
+        )
+        max_retries = max(0, get_env_int('LLM_MAX_RETRIES', DEFAULT_MAX_RETRIES))
+        backoff = get_env_int('LLM_BACKOFF_SECONDS', DEFAULT_BACKOFF_SECONDS)
+        
+        for attempt in range(max_retries + 1):
+            retry_after = None
+            try:
+                # Отправляем запрос
+                response = session.post(api_url, headers=headers, json=data, stream=stream, timeout=timeout)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == max_retries:
+                    response.raise_for_status()
+                    return response
+                reason = f"HTTP {response.status_code}"
+                retry_after = response.headers.get('Retry-After')
+                response.close()
+            except requests.ConnectionError as e:
+                # Сюда попадает и таймаут соединения; таймаут чтения не повторяем —
+                # сервер принял запрос и, вероятно, всё ещё его обрабатывает
+                if attempt == max_retries:
+                    raise
+                reason = str(e)
+            
+            delay = min(MAX_BACKOFF_SECONDS, backoff * (2 ** attempt))
+            if retry_after and retry_after.isdigit():
+                delay = min(MAX_BACKOFF_SECONDS, int(retry_after))
+            delay += random.uniform(0, delay / 2)
+            logger.warning(f"Запрос к LLM не удался ({reason}), повтор {attempt + 1}/{max_retries} через {delay:.1f} с")
+            time.sleep(delay)
+    
+    def _read_event_stream(self, response):
+        # Server-Sent Events: строки "data: {...}", поток завершается "data: [DONE]"
+        parts = []
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                payload = line[5:].strip()
+                if payload == "[DONE]":
+                    break
+                try:
+                    event = json.loads(payload)
+                except json.JSONDecodeError:
+                    logger.warning(f"Некорректное событие потока: {payload[:100]}")
+                    continue
+                choices = event.get("choices") or []
+                if not choices:
+                    continue
+                delta = choices[0].get("delta") or {}
+                text = delta.get("content") or choices[0].get("text") or ""
+                if text:
+                    if not parts:
+                        logger.debug("Получен первый токен ответа")
+                    parts.append(text)
+                    self.token.emit(text)
+        
+        analysis = "".join(parts)
+        logger.debug(f"Потоковый ответ получен, длина: {len(analysis)}")
+        return analysis
+    
+    @staticmethod
+    def _extract_content(result):
+        analysis = "Не удалось получить ответ от LLM"
+        
+        # Проверяем различные варианты структуры ответа
+        if isinstance(result, dict):
+            if "choices" in result and len(result["choices"]) > 0:
+                # Стандартный формат OpenAI
+                if "message" in result["choices"][0] and "content" in result["choices"][0]["message"]:
+                    analysis = result["choices"][0]["message"]["content"]
+                    logger.debug(f"Извлечен ответ в формате OpenAI, длина: {len(analysis)}")
+                    logger.debug(f"Начало ответа: {analysis[:100]}...")
+                    logger.debug(f"Конец ответа: ...{analysis[-100:]}")
+                # Альтернативные форматы
+                elif "text" in result["choices"][0]:
+                    analysis = result["choices"][0]["text"]
+                    logger.debug(f"Извлечен ответ из поля text, длина: {len(analysis)}")
+            # LM Studio может использовать свой формат
+            elif "response" in result:
+                analysis = result["response"]
+                logger.debug(f"Извлечен ответ из поля response, длина: {len(analysis)}")
+            
+        # Если ничего не нашли, используем весь ответ как текст
+        if analysis == "Не удалось получить ответ от LLM":
+            logger.warning("Не удалось извлечь ответ из стандартных полей, использую сырой ответ")
+            analysis = str(result)
+            logger.debug(f"Сырой ответ, длина: {len(analysis)}")
+        
+        return analysis
+    
+    def _prepare_logs(self, use_filter, use_templates, max_chars):
+        # Один проход по логам даёт и оценки строк, и шаблоны: в промпт идут
+        # самые важные окна исходных строк и сводка шаблонов по всему корпусу.
+        # Заголовки входят в max_chars, окнам при сводке шаблонов — не больше половины
+        self.progress.emit("Отбор важных строк логов...")
+        miner = TemplateMiner.from_env()
+        prepared = LogBuffer()
+        window_lines = []
+        budget = max_chars
+        if use_templates:
+            budget -= len(TEMPLATE_SUMMARY_HEADER) + 1
+        if use_filter:
+            log_filter = LogFilter.from_env(miner).add_lines(self.logs.iter_lines())
+            window_budget = budget // 2 if use_templates else budget
+            log_filter.max_chars = min(log_filter.max_chars, window_budget - len(FILTERED_WINDOWS_HEADER) - 1)
+            windows = log_filter.select_windows()
+            if windows:
+                window_lines = log_filter.window_lines_text(self.logs.iter_lines(), windows)
+                prepared.append([FILTERED_WINDOWS_HEADER] + window_lines)
+                budget -= prepared.char_count + 1
+        if use_templates:
+            if not use_filter:
+                miner.add_lines(self.logs.iter_lines())
+            summary = fit_lines(miner.summary_lines(shown=set(window_lines)), budget)
+            if summary:
+                prepared.append([TEMPLATE_SUMMARY_HEADER] + summary)
+        logger.debug(f"Подготовка логов: {len(miner.templates)} шаблонов, "
+                     f"{prepared.char_count} символов вместо {self.logs.char_count}")
+        return prepared if prepared.char_count else self.logs
+    
+    def _analysis_mode(self):
+        mode = os.getenv('LLM_ANALYSIS_MODE', 'auto').strip().lower()
+        if mode not in {'auto', 'single', 'mapreduce'}:
+            logger.warning(f"Неизвестный режим анализа {mode}, используется auto")
+            mode = 'auto'
+        return mode
+    
+    def _chunk_step(self, chunk_chars, max_chunks):
+        # Фрагменты не короче половины бюджета, поэтому их не больше двух оценок:
+        # точное число считается отдельным проходом, только если лимит может быть превышен
+        count = self.logs.char_count // max(1, chunk_chars) + 1
+        if max_chunks <= 0 or 2 * count <= max_chunks:
+            return count, 1
+        count = sum(1 for _ in self.logs.iter_content_chunks(chunk_chars))
+        if count <= max_chunks:
+            return count, 1
+        # Если фрагментов больше лимита, берём их равномерно по всему корпусу
+        step = -(-count // max_chunks)
+        logger.warning(f"Фрагментов {count}, лимит {max_chunks}: анализируется каждый {step}-й")
+        self.progress.emit(f"Логи слишком велики: анализируется каждый {step}-й фрагмент")
+        return -(-count // step), step
+    
+    def _select_chunks(self, chunk_chars, step):
+        # Границы фрагментов зависят от содержимого, а не от смещения, поэтому
+        # при изменении части логов остальные фрагменты и их ответы в кэше совпадают
+        for i, chunk in enumerate(self.logs.iter_content_chunks(chunk_chars)):
+            if i % step == 0:
+                yield chunk
+    
+    def _run_parallel(self, prompts, workers, label):
+        # Ограниченное число одновременных запросов и ограниченное окно
+        # отправленных задач: фрагменты не накапливаются в памяти
+        results = {}
+        completed = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = {}
+            
+            def collect(futures):
+                nonlocal completed
+                for future in futures:
+                    results[pending.pop(future)] = future.result()
+                    completed += 1
+                    self.progress.emit(f"{label}: готово {completed}")
+            
+            for index, prompt in enumerate(prompts):
+                pending[executor.submit(self._request_completion, prompt)] = index
+                if len(pending) >= workers * 2:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+            collect(list(as_completed(pending)))
+        return [results[index] for index in sorted(results)]
+    
+    @staticmethod
+    def _merge_partials(items, chunk_chars):
+        limit = chunk_chars // max(1, len(items))
+        return "\n\n".join(item[:limit] for item in items)
+    
+    def _map_reduce(self, similar_logs):
+        chunk_chars = get_env_int('LLM_CHUNK_TOKENS', DEFAULT_CHUNK_TOKENS) * CHARS_PER_TOKEN
+        max_chunks = get_env_int('LLM_MAX_MAP_CHUNKS', DEFAULT_MAX_MAP_CHUNKS)
+        workers = max(1, get_env_int('LLM_MAP_WORKERS', DEFAULT_MAP_WORKERS))
+        
+        chunk_count, step = self._chunk_step(chunk_chars, max_chunks)
+        self.progress.emit(f"Анализ логов по фрагментам: около {chunk_count}, параллельно {workers}")
+        
+        prompts = (
+            DEFAULT_MAP_PROMPT.format(current_logs=chunk)
+            for chunk in self._select_chunks(chunk_chars, step)
+        )
+        partials = self._run_parallel(prompts, workers, "Анализ фрагментов")
+        logger.debug(f"Получено частичных результатов: {len(partials)}")
+        
+        # Иерархическая свёртка: группы частичных результатов, не превышающие
+        # бюджет фрагмента, сводятся по отдельности, пока не останется одна группа.
+        # Каждый результат группы обрезается до своей доли бюджета
+        level = partials
+        while True:
+            groups = []
+            group = []
+            size = 0
+            for item in level:
+                if group and size + len(item) > chunk_chars:
+                    groups.append(group)
+                    group = []
+                    size = 0
+                group.append(item)
+                size += len(item) + 2
+            if group:
+                groups.append(group)
+            
+            if len(groups) >= len(level) > 1:
+                # Результаты длиннее половины бюджета не группируются: сводим их попарно
+                groups = [level[i:i + 2] for i in range(0, len(level), 2)]
+            if len(groups) <= 1:
+                self.progress.emit("Сведение результатов анализа...")
+                return self._final_completion(
+                    DEFAULT_REDUCE_PROMPT,
+                    partial_results=self._merge_partials(level, chunk_chars),
+                    similar_logs=similar_logs
+                )
+            
+            prompts = (
+                DEFAULT_REDUCE_PROMPT.format(partial_results=self._merge_partials(group, chunk_chars), similar_logs="")
+                for group in groups
+            )
+            level = self._run_parallel(prompts, workers, "Сведение результатов")
+    
     def run(self):
         try:
             logger.debug("Начало анализа с помощью LLM")
@@ -28,83 +403,54 @@ class LLMAnalyzer(QThread):
             current_prompt = os.getenv('LLM_PROMPT', DEFAULT_LOG_ANALYSIS_PROMPT)
             logger.debug(f"Загружен пользовательский промпт, длина: {len(current_prompt)}")
             
-            embeddings = self.vectorizer.get_embeddings(self.log_text)
-            logger.debug("Получены эмбеддинги")
-            
-            similar_logs = self.vectorizer.search(embeddings, k=2)
-            logger.debug("Найдены похожие логи")
+            # Итоговый ответ передаётся в интерфейс по мере генерации
+            self.stream = get_env_bool('LLM_STREAM', True)
+            self.cache = ResponseCache.from_env() if get_env_bool('LLM_CACHE', True) else None
+            self.from_cache = False
             
             max_chars = 2000
-            truncated_logs = self.log_text[:max_chars] + "..." if len(self.log_text) > max_chars else self.log_text
-            truncated_similar = similar_logs[:max_chars] + "..." if len(similar_logs) > max_chars else similar_logs
+            mode = self._analysis_mode()
+            
+            # Отбор и шаблоны сокращают только текст одиночного промпта и только
+            # когда исходные логи в него не помещаются: эмбеддинги и map-reduce
+            # работают с исходными строками
+            use_filter = get_env_bool('LOG_FILTER', True)
+            use_templates = get_env_bool('LOG_TEMPLATES', True)
+            prompt_logs = self.logs
+            if mode != 'mapreduce' and (use_filter or use_templates) and self.logs.char_count > max_chars:
+                prompt_logs = self._prepare_logs(use_filter, use_templates, max_chars)
             
-            # Формируем промпт, используя актуальный шаблон
-            prompt = current_prompt.format(
-                current_logs=truncated_logs,
-                similar_logs=truncated_similar
+            # Map-reduce нужен только тогда, когда логи не помещаются в один запрос
+            if mode == 'auto':
+                mode = 'mapreduce' if prompt_logs.char_count > max_chars else 'single'
+            logger.debug(f"Режим анализа: {mode}")
+            
+            # Окна по всему корпусу, а не только первые 512 токенов
+            embeddings = self.vectorizer.embed_corpus(
+                self.logs.iter_chunks(self.vectorizer.window_chars),
+                total_chars=self.logs.char_count
             )
+            logger.debug(f"Получены эмбеддинги: {len(embeddings)} окон")
+            
+            similar_logs = self.vectorizer.search_many(embeddings, k=2)
+            logger.debug("Найдены похожие логи")
             
-            logger.debug("Отправка запроса к LLM")
-            headers = {
-                "Content-Type": "application/json"
-            }
-            
-            if self.api_key:
-                headers["Authorization"] = f"Bearer {self.api_key}"
-            
-            data = {
-                "model": "default",
-                "messages": [
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": os.getenv('LLM_TEMPERATURE'),
-                "max_tokens": os.getenv('LLM_MAX_TOKENS')
-            }
-            
-            # Коррекция URL
-            endpoint = "/v1/chat/completions"
-            if self.api_url.endswith(endpoint):
-                api_url = self.api_url
-            elif self.api_url.endswith("/"):
-                api_url = f"{self.api_url[:-1]}{endpoint}"
+            truncated_similar = similar_logs[:max_chars] + "..." if len(similar_logs) > max_chars else similar_logs
+            
+            if mode == 'mapreduce':
+                analysis = self._map_reduce(truncated_similar)
             else:
-                api_url = f"{self.api_url}{endpoint}"
-                
-            logger.debug(f"Отправка запроса на URL: {api_url}")
-            logger.debug(f"Длина запроса: {len(prompt)} символов")
-            
-            # Отправляем запрос
-            response = requests.post(api_url, headers=headers, json=data)
-            response.raise_for_status()
-            
-            result = response.json()
-            logger.debug(f"Получен ответ API: {str(result)[:200]}...")
-            
-            analysis = "Не удалось получить ответ от LLM"
-            
-            # Проверяем различные варианты структуры ответа
-            if isinstance(result, dict):
-                if "choices" in result and len(result["choices"]) > 0:
-                    # Стандартный формат OpenAI
-                    if "message" in result["choices"][0] and "content" in result["choices"][0]["message"]:
-                        analysis = result["choices"][0]["message"]["content"]
-                        logger.debug(f"Извлечен ответ в формате OpenAI, длина: {len(analysis)}")
-                        logger.debug(f"Начало ответа: {analysis[:100]}...")
-                        logger.debug(f"Конец ответа: ...{analysis[-100:]}")
-                    # Альтернативные форматы
-                    elif "text" in result["choices"][0]:
-                        analysis = result["choices"][0]["text"]
-                        logger.debug(f"Извлечен ответ из поля text, длина: {len(analysis)}")
-                # LM Studio может использовать свой формат
-                elif "response" in result:
-                    analysis = result["response"]
-                    logger.debug(f"Извлечен ответ из поля response, длина: {len(analysis)}")
+                truncated_logs = prompt_logs.head_text(max_chars)
+                if prompt_logs.char_count > max_chars:
+                    truncated_logs += "..."
                 
-            # Если ничего не нашли, используем весь ответ как текст
-            if analysis == "Не удалось получить ответ от LLM":
-                logger.warning("Не удалось извлечь ответ из стандартных полей, использую сырой ответ")
-                analysis = str(result)
-                logger.debug(f"Сырой ответ, длина: {len(analysis)}")
+                # Формируем промпт, используя актуальный шаблон
+                logger.debug("Отправка запроса к LLM")
+                analysis = self._final_completion(
+                    current_prompt,
+                    current_logs=truncated_logs,
+                    similar_logs=truncated_similar
+                )
                 
             # Проверяем целостность ответа
             if analysis and analysis[-1:] in {'.', '!', '?', ':', ';', ','}:
@@ -120,7 +466,7 @@ class LLMAnalyzer(QThread):
                 # Добавляем предупреждение в конец ответа
                 analysis += "\n\n[Внимание: ответ может быть обрезан из-за ограничений API]"
             
-            self.finished.emit(analysis)
+            self.finished.emit(analysis, self.from_cache)
             
         except Exception as e:
             error_message = f"Ошибка при анализе: {str(e)}"
@@ -145,8 +491,14 @@ class LLMAnalyzer(QThread):
                     error_message = "Ошибка авторизации. Проверьте API ключ в настройках."
                 elif status_code == 404:
                     error_message = "Ошибка: Сервер LLM не найден. Проверьте URL в настройках."
+                elif status_code == 429:
+                    error_message = "Сервер LLM перегружен запросами. Пожалуйста, попробуйте позже."
                 elif status_code >= 500:
                     error_message = "Ошибка сервера LLM. Пожалуйста, попробуйте позже."
+            elif isinstance(e, requests.Timeout):
+                error_message = "Сервер LLM не ответил вовремя. Проверьте, что сервер запущен, или увеличьте LLM_READ_TIMEOUT."
+            elif isinstance(e, requests.ConnectionError):
+                error_message = "Не удалось подключиться к серверу LLM. Проверьте URL в настройках."
             
             logger.error(error_message, exc_info=True)
             self.error.emit(error_message) 
\ No newline at end of file
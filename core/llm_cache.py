@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from core.constants import logger, get_env_int
+
+DEFAULT_CACHE_DIR = "./llm_cache"
+DEFAULT_CACHE_MAX_MB = 200
+DEFAULT_CACHE_MAX_AGE_DAYS = 30
+
+class ResponseCache:
+    """Дисковый кэш ответов LLM с адресацией по содержимому запроса.
+
+    Ключ — SHA-256 от всех параметров, влияющих на ответ. Срок хранения
+    отсчитывается от записи ответа (поле created, оно же время изменения
+    файла), а при каждом попадании обновляется время доступа, поэтому при
+    превышении размера первыми удаляются давно не использованные записи.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MAX_MB * 1024 * 1024,
+                 max_age=DEFAULT_CACHE_MAX_AGE_DAYS * 86400):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self._size = self._scan()
+        logger.debug(f"Кэш ответов LLM: {self.directory}, размер {self._size} байт")
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            directory=os.getenv('LLM_CACHE_DIR', DEFAULT_CACHE_DIR),
+            max_bytes=get_env_int('LLM_CACHE_MAX_MB', DEFAULT_CACHE_MAX_MB) * 1024 * 1024,
+            max_age=get_env_int('LLM_CACHE_MAX_AGE_DAYS', DEFAULT_CACHE_MAX_AGE_DAYS) * 86400
+        )
+
+    @staticmethod
+    def make_key(**parts):
+        payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_atime, stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _expired(self, created):
+        return self.max_age > 0 and time.time() - created > self.max_age
+
+    def _scan(self):
+        # Удаляем устаревшие записи и считаем общий размер
+        total = 0
+        for _, mtime, size, path in self._entries():
+            if self._expired(mtime):
+                self._remove(path)
+            else:
+                total += size
+        return total
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"Не удалось удалить запись кэша {path}: {e}")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            stat = os.stat(path)
+            if self._expired(entry.get("created", stat.st_mtime)):
+                with self._lock:
+                    self._remove(path)
+                return None
+            # Время изменения остаётся временем записи, отмечается только использование
+            os.utime(path, (time.time(), stat.st_mtime))
+            return entry["response"]
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Повреждённая запись кэша {path}: {e}")
+            return None
+
+    def put(self, key, value):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"created": time.time(), "response": value}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._size += os.path.getsize(path)
+                if self._size > self.max_bytes:
+                    self._evict()
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить ответ в кэш: {e}")
+
+    def _evict(self):
+        # Удаляем давно не использованные записи, пока не освободим 10% лимита
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, _, size, path in entries:
+            if total <= target:
+                break
+            self._remove(path)
+            total -= size
+        self._size = total
+        logger.debug(f"Кэш ответов LLM очищен до {total} байт")
@@ -0,0 +1,171 @@
+import sys
+import json
+import zlib
+import tempfile
+import threading
+from core.constants import logger
+
+class LogBuffer:
+    """Хранилище обработанных строк с ограничением памяти.
+
+    Пока объём не превышает memory_limit байт, строки держатся в памяти,
+    после этого всё содержимое сбрасывается во временный файл на диске
+    (массивами JSON по строке на пакет: записи могут содержать переводы строк).
+    Объём считается по размеру объектов str и ячеек списка, а не по числу символов.
+    Начало логов всегда доступно из памяти для предпросмотра.
+    """
+
+    HEAD_CHARS = 64 * 1024
+    # Записей в одной строке файла сброса
+    SPILL_BATCH_LINES = 4096
+    # Ячейка списка, ссылающаяся на строку
+    LINE_SLOT_BYTES = 8
+
+    def __init__(self, memory_limit=None):
+        self.memory_limit = memory_limit
+        self.line_count = 0
+        self._total_chars = 0
+        self._lines = []
+        self._memory_bytes = 0
+        self._head = []
+        self._head_chars = 0
+        self._spill = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_text(cls, text):
+        buffer = cls()
+        if text:
+            buffer.append(text.split('\n'))
+        return buffer
+
+    @property
+    def char_count(self):
+        # Длина текста, который получился бы при склейке строк через "\n"
+        return max(0, self._total_chars - 1)
+
+    @property
+    def spilled(self):
+        return self._spill is not None
+
+    def __len__(self):
+        return self.line_count
+
+    def append(self, lines):
+        if not lines:
+            return
+        with self._lock:
+            for line in lines:
+                if self._head_chars >= self.HEAD_CHARS:
+                    break
+                self._head.append(line)
+                self._head_chars += len(line) + 1
+
+            chars = sum(len(line) + 1 for line in lines)
+            self.line_count += len(lines)
+            self._total_chars += chars
+
+            if self._spill is not None:
+                self._write(lines)
+                return
+
+            self._lines.extend(lines)
+            self._memory_bytes += sum(map(sys.getsizeof, lines)) + self.LINE_SLOT_BYTES * len(lines)
+            if self.memory_limit is not None and self._memory_bytes > self.memory_limit:
+                logger.debug(f"Превышен лимит памяти буфера ({self.memory_limit} байт), сброс на диск")
+                self._spill = tempfile.TemporaryFile(mode='w+', encoding='utf-8', newline='\n')
+                self._write(self._lines)
+                self._lines = []
+                self._memory_bytes = 0
+
+    def _write(self, lines):
+        self._spill.seek(0, 2)
+        for start in range(0, len(lines), self.SPILL_BATCH_LINES):
+            self._spill.write(json.dumps(lines[start:start + self.SPILL_BATCH_LINES], ensure_ascii=False))
+            self._spill.write("\n")
+
+    def head(self, max_lines):
+        return self._head[:max_lines]
+
+    def head_text(self, max_chars):
+        text = "\n".join(self._head)
+        if len(text) > max_chars or self._total_chars <= self._head_chars:
+            return text[:max_chars]
+        # Начало в памяти короче запрошенного — дочитываем из основного хранилища
+        parts = []
+        total = 0
+        for chunk in self.iter_chunks(max_chars):
+            parts.append(chunk)
+            total += len(chunk) + 1
+            if total >= max_chars:
+                break
+        return "\n".join(parts)[:max_chars]
+
+    def iter_lines(self):
+        if self._spill is None:
+            # Без копии списка: при сбросе на диск и закрытии он заменяется
+            # новым, а не очищается, поэтому начатый обход дочитывает прежний
+            yield from self._lines
+            return
+        position = 0
+        while True:
+            with self._lock:
+                self._spill.flush()
+                self._spill.seek(position)
+                block = []
+                size = 0
+                while size < 1024 * 1024:
+                    line = self._spill.readline()
+                    if not line:
+                        break
+                    block.extend(json.loads(line))
+                    size += len(line)
+                position = self._spill.tell()
+            if not block:
+                break
+            yield from block
+
+    def iter_chunks(self, max_chars):
+        chunk = []
+        size = 0
+        for line in self.iter_lines():
+            if chunk and size + len(line) + 1 > max_chars:
+                yield "\n".join(chunk)
+                chunk = []
+                size = 0
+            chunk.append(line)
+            size += len(line) + 1
+        if chunk:
+            yield "\n".join(chunk)
+
+    def iter_content_chunks(self, max_chars, boundary_mask=7):
+        # Граница ставится после строки, чья контрольная сумма делится на
+        # (boundary_mask + 1), но не раньше половины max_chars: вставка или
+        # удаление строк меняет только соседние фрагменты
+        chunk = []
+        size = 0
+        min_chars = max_chars // 2
+        for line in self.iter_lines():
+            if chunk and size + len(line) + 1 > max_chars:
+                yield "\n".join(chunk)
+                chunk = []
+                size = 0
+            chunk.append(line)
+            size += len(line) + 1
+            if size >= min_chars and not zlib.crc32(line.encode('utf-8')) & boundary_mask:
+                yield "\n".join(chunk)
+                chunk = []
+                size = 0
+        if chunk:
+            yield "\n".join(chunk)
+
+    def close(self):
+        with self._lock:
+            if self._spill is not None:
+                try:
+                    self._spill.close()
+                except Exception as e:
+                    logger.error(f"Ошибка при закрытии временного файла буфера: {e}")
+                self._spill = None
+            self._lines = []
+            self._memory_bytes = 0
@@ -0,0 +1,177 @@
+import re
+import math
+from array import array
+import numpy as np
+from core.constants import logger, get_env_int
+from core.log_templates import TemplateMiner
+
+# Отбор строк перед LLM: каждая строка получает оценку важности, логи режутся
+# на окна по несколько строк, и в промпт попадают окна с наибольшей суммой оценок
+DEFAULT_WINDOW_LINES = 10
+DEFAULT_MAX_CHARS = 2000
+
+# Шаблоны проверяются только с начала слова; уровень ищется в строке,
+# приведённой к нижнему регистру, без медленного re.IGNORECASE
+SEVERITY_PATTERN = re.compile(
+    r'(?<!\w)(?:(?P<fatal>fatal|panic|emerg(?:ency)?|crit(?:ical)?|alert)'
+    r'|(?P<error>error|err|severe|failed|failure)'
+    r'|(?P<warning>warn(?:ing)?|denied|refused|timeout|timed out))(?!\w)'
+)
+SEVERITY_WEIGHTS = {'fatal': 5.0, 'error': 3.0, 'warning': 1.0}
+EXCEPTION_PATTERN = re.compile(
+    r'(?:Exception|Error)(?::|\s+at\b)|(?<![\w$.])(?:at [\w$.<>/]+\(|Traceback \(most recent call last\)'
+    r'|Caused by:|segfault|core dumped|OutOfMemory|stack overflow)'
+)
+EXCEPTION_WEIGHT = 3.0
+RARE_TEMPLATE_WEIGHT = 3.0
+SPIKE_WEIGHT = 1.0
+MAX_SPIKE = 3.0
+# Разрыв между несмежными окнами в тексте для промпта
+GAP_MARK = "..."
+
+# Минута события: ISO 8601, syslog (Jan  5 10:00) и access-лог (10/Oct/2024:13:55)
+TIMESTAMP_PATTERN = re.compile(
+    r'(\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2})'
+    r'|\b([A-Z][a-z]{2} {1,2}\d{1,2} \d{2}:\d{2})'
+    r'|(\d{2}/[A-Z][a-z]{2}/\d{4}:\d{2}:\d{2})'
+)
+
+def line_minute(line):
+    match = TIMESTAMP_PATTERN.search(line)
+    return match.group(match.lastindex) if match else None
+
+class LogFilter:
+    """Оценка важности строк и выбор окон логов для промпта.
+
+    За один проход по строкам собираются признаки: уровень, сигнатуры
+    исключений, шаблон строки (через TemplateMiner) и минута события.
+    Итоговые оценки, суммы по окнам и выбор лучших окон считаются
+    векторно в numpy.
+    """
+
+    def __init__(self, window_lines=DEFAULT_WINDOW_LINES, max_chars=DEFAULT_MAX_CHARS, miner=None):
+        self.window_lines = max(1, window_lines)
+        self.max_chars = max_chars
+        self.miner = miner if miner is not None else TemplateMiner()
+        self.base_scores = array('f')
+        self.template_ids = array('q')
+        self.minute_ids = array('q')
+        self.lengths = array('q')
+        self._template_index = {}
+        self._minute_index = {}
+
+    @classmethod
+    def from_env(cls, miner=None):
+        return cls(
+            window_lines=get_env_int('LOG_FILTER_WINDOW_LINES', DEFAULT_WINDOW_LINES),
+            max_chars=get_env_int('LOG_FILTER_MAX_CHARS', DEFAULT_MAX_CHARS),
+            miner=miner
+        )
+
+    @property
+    def line_count(self):
+        return len(self.base_scores)
+
+    def add(self, line):
+        score = 0.0
+        match = SEVERITY_PATTERN.search(line.lower())
+        if match:
+            score += SEVERITY_WEIGHTS[match.lastgroup]
+        if EXCEPTION_PATTERN.search(line):
+            score += EXCEPTION_WEIGHT
+        self.base_scores.append(score)
+
+        template = self.miner.add(line)
+        self.template_ids.append(-1 if template is None else
+                                 self._template_index.setdefault(id(template), len(self._template_index)))
+        minute = line_minute(line)
+        self.minute_ids.append(-1 if minute is None else
+                               self._minute_index.setdefault(minute, len(self._minute_index)))
+        self.lengths.append(len(line) + 1)
+
+    def add_lines(self, lines):
+        for line in lines:
+            self.add(line)
+        return self
+
+    def template_counts(self):
+        # Число строк шаблона по его номеру в порядке первого появления
+        counts = np.zeros(len(self._template_index), dtype=np.float64)
+        by_id = {id(template): template.count for template in self.miner.templates}
+        for key, index in self._template_index.items():
+            counts[index] = by_id.get(key, 0)
+        return counts
+
+    def scores(self):
+        scores = np.frombuffer(self.base_scores, dtype=np.float32).astype(np.float64)
+        total = len(scores)
+        if total < 2:
+            return scores
+
+        # Редкие шаблоны: доля -log(p) от максимума, у единичной строки — полный вес
+        ids = np.frombuffer(self.template_ids, dtype=np.int64)
+        counts = self.template_counts()
+        if len(counts):
+            rarity = np.log(total / np.maximum(counts, 1)) / math.log(total)
+            known = ids >= 0
+            scores[known] += RARE_TEMPLATE_WEIGHT * rarity[ids[known]]
+
+        # Всплески частоты: минуты, где строк больше медианы по всем минутам
+        minutes = np.frombuffer(self.minute_ids, dtype=np.int64)
+        timed = minutes >= 0
+        if timed.any():
+            per_minute = np.bincount(minutes[timed]).astype(np.float64)
+            median = max(1.0, float(np.median(per_minute)))
+            spike = np.clip(np.log2(per_minute / median), 0.0, MAX_SPIKE)
+            scores[timed] += SPIKE_WEIGHT * spike[minutes[timed]]
+        return scores
+
+    def select_windows(self):
+        """Номера лучших окон в порядке следования, укладывающихся в max_chars.
+
+        Окна с тем же набором шаблонов, что у уже выбранного, пропускаются:
+        сотня одинаковых ошибок не должна занять весь бюджет. В бюджет
+        входит и отметка разрыва перед каждым окном.
+        """
+        if not self.line_count:
+            return []
+        starts = np.arange(0, self.line_count, self.window_lines)
+        window_scores = np.add.reduceat(self.scores(), starts)
+        window_chars = np.add.reduceat(np.frombuffer(self.lengths, dtype=np.int64), starts)
+        ids = np.frombuffer(self.template_ids, dtype=np.int64)
+        signatures = np.add.reduceat((ids * 0x9E3779B1) & 0xFFFFFFFF, starts)
+
+        selected = []
+        seen = set()
+        budget = self.max_chars
+        for window in np.argsort(-window_scores, kind='stable'):
+            if window_scores[window] <= 0 or budget <= 0:
+                break
+            cost = int(window_chars[window]) + len(GAP_MARK) + 1
+            if signatures[window] in seen or cost > budget:
+                continue
+            seen.add(signatures[window])
+            selected.append(int(window))
+            budget -= cost
+        selected.sort()
+        logger.debug(f"Отобрано окон: {len(selected)} из {len(starts)}")
+        return selected
+
+    def window_lines_text(self, lines, windows):
+        # Второй проход по логам: строки выбранных окон, разрывы помечены "..."
+        if not windows:
+            return []
+        starts = {window * self.window_lines for window in windows}
+        last = max(starts) + self.window_lines
+        result = []
+        end = -1
+        for index, line in enumerate(lines):
+            if index >= last:
+                break
+            if index in starts:
+                if end >= 0 and end != index:
+                    result.append(GAP_MARK)
+                end = index + self.window_lines
+            if index < end:
+                result.append(line)
+        return result
@@ -0,0 +1,145 @@
+import os
+import time
+from PySide6.QtCore import QObject, QTimer, QFileSystemWatcher, Signal
+from core.constants import logger, get_env_int, SUPPORTED_EXTENSIONS, SUPPORTED_ARCHIVES
+from core.log_buffer import LogBuffer
+from core.log_processor import LogProcessor
+from core.log_filter import LogFilter, GAP_MARK
+
+DEFAULT_POLL_SECONDS = 5
+DEFAULT_ANALYSIS_INTERVAL_SECONDS = 60
+# Системные лимиты inotify невелики, поэтому число файлов под наблюдением ограничено;
+# остальные изменения ловит периодический опрос
+MAX_WATCHED_FILES = 1000
+DEBOUNCE_MS = 1000
+
+class LogFollower(QObject):
+    """Слежение за папкой с логами.
+
+    Изменения отслеживаются через QFileSystemWatcher (inotify в Linux) и
+    периодическим опросом. Каждый проход — инкрементальный LogProcessor,
+    который разбирает только дописанные байты. Окна новых строк отбираются
+    тем же LogFilter, что и при обычном анализе, копятся и отдаются на анализ
+    не чаще заданного интервала.
+    """
+
+    status = Signal(str)
+    anomalies = Signal(object)
+
+    def __init__(self, folder_path, parent=None):
+        super().__init__(parent)
+        self.folder_path = folder_path
+        self.poll_seconds = max(1, get_env_int('FOLLOW_POLL_SECONDS', DEFAULT_POLL_SECONDS))
+        self.analysis_interval = get_env_int('FOLLOW_ANALYSIS_INTERVAL_SECONDS', DEFAULT_ANALYSIS_INTERVAL_SECONDS)
+        self.processor = None
+        self.pending = []
+        self.last_emit = 0.0
+        self.rescan_requested = False
+        self.baseline_done = False
+        self.running = False
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self._on_change)
+        self.watcher.fileChanged.connect(self._on_change)
+
+        self.debounce = QTimer(self)
+        self.debounce.setSingleShot(True)
+        self.debounce.setInterval(DEBOUNCE_MS)
+        self.debounce.timeout.connect(self._scan)
+
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(self.poll_seconds * 1000)
+        self.poll_timer.timeout.connect(self._scan)
+
+    def start(self):
+        logger.debug(f"Запуск слежения за папкой: {self.folder_path}")
+        self.running = True
+        self._update_watches()
+        self.poll_timer.start()
+        # Первый проход только запоминает текущее состояние файлов в манифесте
+        self.status.emit("Follow mode: indexing existing logs...")
+        self._scan()
+
+    def stop(self):
+        logger.debug("Остановка слежения за папкой")
+        self.running = False
+        self.poll_timer.stop()
+        self.debounce.stop()
+        paths = self.watcher.files() + self.watcher.directories()
+        if paths:
+            self.watcher.removePaths(paths)
+
+    def _update_watches(self):
+        directories = []
+        files = []
+        for root, _, names in os.walk(self.folder_path):
+            directories.append(root)
+            for name in names:
+                ext = os.path.splitext(name)[1].lower()
+                if ext in SUPPORTED_EXTENSIONS or ext in SUPPORTED_ARCHIVES:
+                    files.append(os.path.join(root, name))
+        watched = set(self.watcher.files()) | set(self.watcher.directories())
+        new_paths = [path for path in directories + files[:MAX_WATCHED_FILES] if path not in watched]
+        if new_paths:
+            self.watcher.addPaths(new_paths)
+
+    def _on_change(self, path):
+        if self.running:
+            self.debounce.start()
+
+    def _scan(self):
+        if not self.running:
+            return
+        if self.processor is not None and self.processor.isRunning():
+            self.rescan_requested = True
+            return
+        self.rescan_requested = False
+        # Ротация логов: новые файлы тоже нужно поставить под наблюдение
+        self._update_watches()
+        self.processor = LogProcessor(self.folder_path, incremental=True, replay_cached=False)
+        self.processor.finished.connect(self._on_processed)
+        self.processor.error.connect(self._on_error)
+        self.processor.start()
+
+    def _on_processed(self, processed_logs):
+        if isinstance(processed_logs, str):
+            processed_logs = LogBuffer.from_text(processed_logs)
+        new_lines = processed_logs.line_count
+        if not self.baseline_done:
+            self.baseline_done = True
+            processed_logs.close()
+            self.status.emit("Follow mode: watching for new log lines")
+            return
+
+        if new_lines:
+            log_filter = LogFilter.from_env().add_lines(processed_logs.iter_lines())
+            windows = log_filter.window_lines_text(processed_logs.iter_lines(), log_filter.select_windows())
+            if self.pending and windows:
+                self.pending.append(GAP_MARK)
+            self.pending.extend(windows)
+            logger.debug(f"Новых строк: {new_lines}, строк в окнах аномалий: {len(windows)}")
+            self.status.emit(f"Follow mode: {new_lines} new lines, {len(self.pending)} pending anomaly lines")
+        processed_logs.close()
+        self._flush_pending()
+        self._rescan_if_requested()
+
+    def _rescan_if_requested(self):
+        if self.rescan_requested:
+            self._scan()
+
+    def _flush_pending(self):
+        if not self.pending or time.monotonic() - self.last_emit < self.analysis_interval:
+            return
+        buffer = LogBuffer()
+        buffer.append(self.pending)
+        self.pending = []
+        self.last_emit = time.monotonic()
+        self.anomalies.emit(buffer)
+
+    def _on_error(self, message):
+        # Отсутствие файлов или временная ошибка чтения не должны прерывать слежение
+        logger.warning(f"Ошибка прохода слежения: {message}")
+        self.status.emit(f"Follow mode: {message}")
+        # Папка могла быть пустой: всё, что появится в ней дальше, уже новые строки
+        self.baseline_done = True
+        self._rescan_if_requested()
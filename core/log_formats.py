@@ -0,0 +1,273 @@
+import os
+import re
+import json
+from itertools import chain, islice
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# Формат построчного лога определяется по первым непустым строкам содержимого;
+# расширение файла используется, только если ни один формат не узнан
+SNIFF_LINES = 50
+MIN_SNIFF_SHARE = 0.6
+
+SYSLOG_LEVELS = ['EMERG', 'ALERT', 'CRIT', 'ERROR', 'WARNING', 'NOTICE', 'INFO', 'DEBUG']
+
+def get_json_fields():
+    # LOG_JSON_FIELDS="timestamp|@timestamp,level|severity,message|msg": через запятую — поля
+    # записи, через | — альтернативные имена, вложенные ключи — через точку
+    value = os.getenv('LOG_JSON_FIELDS', '')
+    fields = []
+    for field in value.split(','):
+        names = tuple(name.strip() for name in field.split('|') if name.strip())
+        if names:
+            fields.append(names)
+    return fields
+
+def format_json_line(line, fields=None):
+    # Без списка полей запись приводится к компактному виду в одну строку,
+    # иначе из неё берутся только указанные поля
+    try:
+        log_entry = json_loads(line)
+    except ValueError:
+        return line
+    if not fields:
+        return json.dumps(log_entry, ensure_ascii=False, separators=(',', ':'))
+    if not isinstance(log_entry, dict):
+        return line
+    parts = []
+    for names in fields:
+        for name in names:
+            value = log_entry
+            for key in name.split('.'):
+                value = value.get(key) if isinstance(value, dict) else None
+            if value is not None:
+                parts.append(f"{names[0]}: {value}")
+                break
+    return " | ".join(parts) if parts else line
+
+def join_fields(fields):
+    # Пустые и прочерки ('-') пропускаются
+    return " | ".join(f"{name}: {value}" for name, value in fields if value and value != '-')
+
+class LineFormat:
+    """Построчный формат лога из реестра.
+
+    pattern — скомпилированное регулярное выражение строки, render —
+    функция, собирающая из совпадения итоговую запись. Строки, не
+    подошедшие под шаблон, выдаются без изменений.
+    """
+
+    def __init__(self, name, pattern=None, render=None, extensions=()):
+        self.name = name
+        self.pattern = pattern
+        self.render = render
+        self.extensions = set(extensions)
+
+    def score(self, lines):
+        # Доля строк выборки, подходящих под формат
+        if not lines or self.pattern is None:
+            return 0.0
+        match = self.pattern.match
+        return sum(1 for line in lines if match(line)) / len(lines)
+
+    def format_line(self, line):
+        match = self.pattern.match(line)
+        return self.render(match) if match else line
+
+    def line_formatter(self):
+        # None — строки выдаются как есть, без вызова функции на каждую строку
+        return self.format_line if self.render else None
+
+    def format_lines(self, lines):
+        formatter = self.line_formatter()
+        return lines if formatter is None else map(formatter, lines)
+
+class JsonFormat(LineFormat):
+    """JSON Lines: записи сворачиваются до полей LOG_JSON_FIELDS, если они заданы"""
+
+    def score(self, lines):
+        if not lines:
+            return 0.0
+        matched = 0
+        for line in lines:
+            if line.startswith('{'):
+                try:
+                    json_loads(line)
+                    matched += 1
+                except ValueError:
+                    continue
+        return matched / len(lines)
+
+    def format_line(self, line):
+        return format_json_line(line, get_json_fields())
+
+    def line_formatter(self):
+        # Записи JSON Lines и так компактны: без настроенных полей они выдаются
+        # как есть, без разбора и повторной сериализации
+        fields = get_json_fields()
+        if not fields:
+            return None
+        return lambda line: format_json_line(line, fields)
+
+class StackTraceFormat(LineFormat):
+    """Лог Java-приложения: строки стека вызовов присоединяются к записи об исключении.
+
+    Трассировка, попавшая на границу параллельно разбираемых частей файла,
+    делится на две записи.
+    """
+
+    def score(self, lines):
+        # Одной трассировки в начале файла достаточно, но структурированные форматы важнее
+        frames = sum(1 for line in lines if self.pattern.match(line))
+        return MIN_SNIFF_SHARE if frames >= 2 else 0.0
+
+    def format_lines(self, lines):
+        match = self.pattern.match
+        record = None
+        for line in lines:
+            if record is not None and match(line):
+                record.append(line)
+                continue
+            if record is not None:
+                yield " | ".join(record)
+            record = [line]
+        if record is not None:
+            yield " | ".join(record)
+
+class VariantFormat(LineFormat):
+    """Формат с несколькими вариантами строки: каждая строка разбирается первым подошедшим.
+
+    Доля совпадений считается по любому из вариантов, поэтому файл со
+    смесью вариантов узнаётся целиком, а не только по преобладающему.
+    """
+
+    def __init__(self, name, variants, extensions=()):
+        super().__init__(name, extensions=extensions)
+        self.variants = variants
+
+    def score(self, lines):
+        if not lines:
+            return 0.0
+        matchers = [variant.pattern.match for variant in self.variants]
+        return sum(1 for line in lines if any(match(line) for match in matchers)) / len(lines)
+
+    def format_line(self, line):
+        for variant in self.variants:
+            match = variant.pattern.match(line)
+            if match:
+                return variant.render(match)
+        return line
+
+    def line_formatter(self):
+        return self.format_line
+
+LINE_FORMATS = {}
+
+def register_format(line_format):
+    """Добавляет формат в реестр; при равной доле совпадений побеждает зарегистрированный раньше"""
+    LINE_FORMATS[line_format.name] = line_format
+    return line_format
+
+PLAIN = LineFormat('plain')
+
+def detect_format(lines, ext=''):
+    best = None
+    best_share = 0.0
+    for line_format in LINE_FORMATS.values():
+        share = line_format.score(lines)
+        if share > best_share:
+            best, best_share = line_format, share
+    if best is not None and best_share >= MIN_SNIFF_SHARE:
+        return best
+    for line_format in LINE_FORMATS.values():
+        if ext in line_format.extensions:
+            return line_format
+    return PLAIN
+
+def iter_formatted_lines(lines, ext=''):
+    # Формат определяется по первым строкам, которые затем выдаются вместе с остальными
+    lines = iter(lines)
+    head = list(islice(lines, SNIFF_LINES))
+    line_format = detect_format(head, ext)
+    return line_format, line_format.format_lines(chain(head, lines))
+
+def render_syslog(match):
+    priority = match.group('priority')
+    level = SYSLOG_LEVELS[int(priority) % 8] if priority else None
+    program = match.group('program')
+    if match.group('pid') and match.group('pid') != '-':
+        program = f"{program}[{match.group('pid')}]"
+    return join_fields([
+        ('Priority', priority), ('Level', level), ('Time', match.group('time')),
+        ('Host', match.group('host')), ('Program', program), ('Message', match.group('message'))
+    ])
+
+def render_syslog_5424(match):
+    line = render_syslog(match)
+    data = match.group('data')
+    return f"{line} | Data: {data}" if data != '-' else line
+
+def render_access(match):
+    status = match.group('status')
+    level = 'ERROR' if status[0] == '5' else 'WARNING' if status[0] == '4' else 'INFO'
+    return join_fields([
+        ('Level', level), ('Time', match.group('time')), ('Client', match.group('client')),
+        ('User', match.group('user')), ('Request', match.group('request')), ('Status', status),
+        ('Size', match.group('size')), ('Referer', match.group('referer')), ('Agent', match.group('agent'))
+    ])
+
+LOGFMT_PAIR = re.compile(r'([\w.\-/@]+)=("(?:[^"\\]|\\.)*"|\S*)')
+LOGFMT_FIRST_KEYS = ('time', 'ts', 'timestamp', 'level', 'lvl', 'severity', 'msg', 'message')
+
+def render_logfmt(match):
+    pairs = {}
+    for key, value in LOGFMT_PAIR.findall(match.string):
+        if value.startswith('"'):
+            value = value[1:-1].replace('\\"', '"').replace('\\\\', '\\')
+        pairs[key] = value
+    keys = [key for key in LOGFMT_FIRST_KEYS if key in pairs]
+    keys += [key for key in pairs if key not in LOGFMT_FIRST_KEYS]
+    return " | ".join(f"{key}: {pairs[key]}" for key in keys)
+
+SYSLOG_5424 = LineFormat(
+    'syslog-rfc5424',
+    re.compile(r'<(?P<priority>\d{1,3})>1 (?P<time>\S+) (?P<host>\S+) (?P<program>\S+) (?P<pid>\S+) '
+               r'(?P<msgid>\S+) (?P<data>-|(?:\[(?:[^\]\\]|\\.)*\])+)(?: \ufeff?(?P<message>.*))?$'),
+    render_syslog_5424
+)
+
+SYSLOG_3164 = LineFormat(
+    'syslog-rfc3164',
+    re.compile(r'(?:<(?P<priority>\d{1,3})>)?(?P<time>[A-Z][a-z]{2} {1,2}\d{1,2} \d{2}:\d{2}:\d{2}|\d{4}-\d{2}-\d{2}T\S+) '
+               r'(?P<host>\S+) (?P<program>[^\s:\[]+)(?:\[(?P<pid>\d+)\])?: (?P<message>.*)$'),
+    render_syslog
+)
+
+# Оба варианта syslog в одном формате: в файле .syslog они нередко перемешаны
+SYSLOG = register_format(VariantFormat('syslog', (SYSLOG_5424, SYSLOG_3164), extensions={'.syslog'}))
+
+ACCESS_LOG = register_format(LineFormat(
+    'access-log',
+    re.compile(r'(?P<client>\S+) \S+ (?P<user>\S+) \[(?P<time>[^\]]+)\] "(?P<request>(?:[^"\\]|\\.)*)" '
+               r'(?P<status>\d{3}) (?P<size>\d+|-)(?: "(?P<referer>(?:[^"\\]|\\.)*)" "(?P<agent>(?:[^"\\]|\\.)*)")?'),
+    render_access
+))
+
+JSON_LINES = register_format(JsonFormat('json', extensions={'.json', '.jsonl'}))
+
+LOGFMT = register_format(LineFormat(
+    'logfmt',
+    re.compile(r'[\w.\-/@]+=(?:"(?:[^"\\]|\\.)*"|\S*)(?:\s+[\w.\-/@]+=(?:"(?:[^"\\]|\\.)*"|\S*))+\s*$'),
+    render_logfmt
+))
+
+JAVA_STACK_TRACE = register_format(StackTraceFormat(
+    'java-stacktrace',
+    # Кадры стека и строка с классом исключения, следующая за сообщением лога
+    re.compile(r'(?:at [\w$.<>/]+\(.*\)|\.\.\. \d+ (?:more|common frames omitted)|Caused by: \S.*|Suppressed: \S.*'
+               r'|(?:[\w$]+\.)+[\w$]*(?:Exception|Error|Throwable)(?:: .*)?)$')
+))
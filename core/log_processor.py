@@ -1,240 +1,524 @@
 import os
-import json
 import re
 import zipfile
 import tarfile
 import rarfile
 import tempfile
-import win32evtlog
-from multiprocessing import Pool, cpu_count
+import queue
+import itertools
+import contextlib
+import io
+import gzip
+import mmap
+import shutil
+from array import array
+from multiprocessing import Pool, Queue, cpu_count
 from PySide6.QtCore import QThread, Signal
-from core.constants import logger, SUPPORTED_EXTENSIONS, SUPPORTED_ARCHIVES
+from core.constants import (logger, SUPPORTED_EXTENSIONS, SUPPORTED_ARCHIVES,
+                            APPENDABLE_EXTENSIONS, DEFAULT_STREAM_CHUNK_KB, DEFAULT_MEMORY_LIMIT_MB, DEFAULT_SPLIT_MB,
+                            get_env_int, get_env_bool)
+from core.log_buffer import LogBuffer
+from core.manifest import FileManifest, DEFAULT_PARSE_CACHE_DIR
+from core.csv_reader import CsvReader
+from core.evtx_parser import iter_evtx_records, format_event, is_evtx, FILE_HEADER_SIZE, CHUNK_SIZE
+from core.log_formats import get_json_fields, iter_formatted_lines, detect_format, SNIFF_LINES
 
-def process_file_wrapper(args):
-    file_path, supported_extensions, supported_archives, temp_dir = args
-    return LogProcessor.process_file_parallel(
-        file_path,
-        supported_extensions,
-        supported_archives,
-        temp_dir
-    )
+# Столько первых строк уходит в интерфейс для предпросмотра, остальные — только в буфер
+PREVIEW_LINES = 200
+
+def get_xml_record_tag():
+    return os.getenv('LOG_XML_RECORD_TAG', '').strip()
+
+def parse_options():
+    # Настройки среды, от которых зависит вывод парсеров: при их смене кэш разбора сбрасывается
+    return {'json_fields': get_json_fields(), 'xml_record_tag': get_xml_record_tag()}
+
+# Суффикс ротации logrotate после имени исходного файла: app.log.1, app.log-20240101
+ROTATION_SUFFIX = re.compile(r'(?:\.\d{1,4}|-\d{8}(?:\d{2,6})?)$')
+
+def rotation_base(file_path):
+    # Имя файла, ротированной копией которого является file_path (app.log.1.gz → app.log),
+    # или None, если суффикса ротации нет
+    name = os.path.basename(file_path)
+    stem, ext = os.path.splitext(name)
+    if ext.lower() in SUPPORTED_ARCHIVES:
+        name = stem
+    base = ROTATION_SUFFIX.sub('', name)
+    return base if base != name else None
+
+# Размер выборки для определения кодировки и блока декодирования при чтении через mmap
+ENCODING_SAMPLE_BYTES = 64 * 1024
+MMAP_BLOCK_BYTES = 1024 * 1024
+
+# Вложенные архивы крупнее этого размера копируются на диск, а не в память
+NESTED_ARCHIVE_MEMORY_BYTES = 64 * 1024 * 1024
+MAX_ARCHIVE_DEPTH = 3
+
+# Форматы, которые разбираются документом целиком, а не построчно: расширение → метод
+# LogProcessor, принимающий путь или двоичный поток члена архива
+DOCUMENT_PARSERS = {
+    '.evtx': 'iter_evtx_log',
+    '.csv': 'iter_csv_log',
+    '.xml': 'iter_xml_log',
+    '.yaml': 'iter_yaml_log',
+    '.yml': 'iter_yaml_log',
+    '.ini': 'iter_ini_log',
+    '.conf': 'iter_ini_log'
+}
+
+class FileSection(io.RawIOBase):
+    """Участок файла [offset, offset + size) как самостоятельный поток"""
+    
+    def __init__(self, f, offset, size):
+        super().__init__()
+        self._file = f
+        self._position = offset
+        self._end = offset + size
+    
+    def readable(self):
+        return True
+    
+    def readinto(self, buffer):
+        size = min(len(buffer), self._end - self._position)
+        if size <= 0:
+            return 0
+        self._file.seek(self._position)
+        data = self._file.read(size)
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+# Очередь порций строк, общая для рабочих процессов пула
+_stream_queue = None
+
+def init_stream_worker(stream_queue):
+    global _stream_queue
+    _stream_queue = stream_queue
+
+def write_spill_chunk(spill, lines):
+    # Порция записывается как массив длин строк и их общий текст в UTF-8:
+    # читателю не нужно разбирать разделители, а строки могут содержать переводы строк
+    lengths = array('q', map(len, lines))
+    data = "".join(lines).encode('utf-8', 'surrogatepass')
+    offset = spill.tell()
+    spill.write(lengths.tobytes())
+    spill.write(data)
+    return offset, len(lines), len(data)
+
+def read_spill_chunk(spill_path, record):
+    offset, count, size = record
+    with open(spill_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        lengths = array('q')
+        lengths.frombytes(mm[offset:offset + 8 * count])
+        start = offset + 8 * count
+        text = mm[start:start + size].decode('utf-8', 'surrogatepass')
+    lines = []
+    position = 0
+    for length in lengths:
+        lines.append(text[position:position + length])
+        position += length
+    return lines
+
+def stream_file_worker(args):
+    task_id, file_path, start, end, member, supported_extensions, supported_archives, chunk_bytes, spill_path = args
+    count = 0
+    ok = False
+    try:
+        if member is not None:
+            lines_iter = LogProcessor.iter_archive_member(file_path, member, supported_extensions, supported_archives)
+        elif start is None:
+            lines_iter = LogProcessor.iter_file_lines(file_path, supported_extensions, supported_archives)
+        else:
+            lines_iter = LogProcessor.iter_file_range(file_path, start, end)
+        # Строки не сериализуются через очередь: они пишутся в файл задачи,
+        # а родителю передаются только координаты порции
+        with open(spill_path, 'wb') as spill:
+            for lines in LogProcessor.iter_line_chunks(lines_iter, chunk_bytes):
+                record = write_spill_chunk(spill, lines)
+                spill.flush()
+                _stream_queue.put((task_id, record, None))
+                count += len(lines)
+        ok = True
+    except Exception as e:
+        logger.error(f"Ошибка при потоковой обработке файла {file_path}: {str(e)}", exc_info=True)
+    finally:
+        # Маркер завершения задачи отправляется всегда, иначе родитель будет ждать вечно
+        _stream_queue.put((task_id, None, (count, ok)))
+    return count
 
 class LogProcessor(QThread):
     progress = Signal(str)
-    finished = Signal(str)
+    chunk = Signal(list)
+    finished = Signal(object)
     error = Signal(str)
     
-    def __init__(self, folder_path):
+    def __init__(self, folder_path, streaming=None, memory_limit_mb=None, incremental=None, replay_cached=True,
+                 num_processes=None):
         super().__init__()
         self.folder_path = folder_path
         self.supported_extensions = SUPPORTED_EXTENSIONS
         self.supported_archives = SUPPORTED_ARCHIVES
         self.temp_dir = None
-        self.num_processes = min(2, max(1, cpu_count() - 1))
-        logger.debug(f"Инициализация LogProcessor с папкой: {folder_path}")
+        self.spill_dir = None
+        if num_processes is None:
+            num_processes = get_env_int('LOG_WORKERS', 0)
+        # 0 — по числу ядер, одно оставляем интерфейсу
+        self.num_processes = num_processes if num_processes > 0 else max(1, cpu_count() - 1)
+        if streaming is None:
+            streaming = get_env_bool('LOG_STREAMING', True)
+        if memory_limit_mb is None:
+            memory_limit_mb = get_env_int('LOG_MEMORY_LIMIT_MB', DEFAULT_MEMORY_LIMIT_MB)
+        self.streaming = streaming
+        self.memory_limit = max(1, memory_limit_mb) * 1024 * 1024
+        self.chunk_bytes = max(1, get_env_int('LOG_STREAM_CHUNK_KB', DEFAULT_STREAM_CHUNK_KB)) * 1024
+        self.split_bytes = max(1, get_env_int('LOG_SPLIT_MB', DEFAULT_SPLIT_MB)) * 1024 * 1024
+        # Четверть потолка отводится под очередь порций между процессами,
+        # половина — под строки в памяти буфера, остальное уходит на диск
+        self.queue_size = max(2, self.memory_limit // (4 * self.chunk_bytes))
+        if incremental is None:
+            incremental = get_env_bool('LOG_INCREMENTAL', True)
+        self.incremental = incremental
+        # False — выдавать только новые строки (режим слежения за папкой)
+        self.replay_cached = replay_cached
+        self.manifest = None
+        logger.debug(f"Инициализация LogProcessor с папкой: {folder_path}, потоковый режим: {streaming}")
     
     def __del__(self):
         if self.temp_dir and os.path.exists(self.temp_dir):
             try:
-                import shutil
                 shutil.rmtree(self.temp_dir)
             except Exception as e:
                 logger.error(f"Ошибка при удалении временной директории: {e}")
     
     @staticmethod
-    def process_evtx_file(file_path):
-        try:
-            processed_lines = []
-            server = 'localhost'
-            logtype = 'System'
-            hand = win32evtlog.OpenEventLog(server, logtype)
-            flags = win32evtlog.EVENTLOG_BACKWARDS_READ | win32evtlog.EVENTLOG_SEQUENTIAL_READ
-            
-            max_events = 1000
-            
-            while True:
-                events = win32evtlog.ReadEventLog(hand, flags, 0)
-                if not events:
-                    break
-                    
-                for event in events:
-                    try:
-                        if len(processed_lines) >= max_events:
-                            break
-                            
-                        event_data = {
-                            'EventID': event.EventID,
-                            'TimeGenerated': event.TimeGenerated.strftime('%Y-%m-%d %H:%M:%S'),
-                            'SourceName': event.SourceName,
-                            'EventType': event.EventType,
-                            'EventCategory': event.EventCategory,
-                            'StringInserts': event.StringInserts,
-                            'ComputerName': event.ComputerName,
-                            'Sid': event.Sid
-                        }
-                        
-                        if event.StringInserts:
-                            message = ' | '.join(str(x) for x in event.StringInserts if x)
-                        else:
-                            message = event.SourceName
-                            
-                        formatted_line = (
-                            f"EventID: {event_data['EventID']} | "
-                            f"Time: {event_data['TimeGenerated']} | "
-                            f"Source: {event_data['SourceName']} | "
-                            f"Type: {event_data['EventType']} | "
-                            f"Category: {event_data['EventCategory']} | "
-                            f"Message: {message}"
-                        )
-                        processed_lines.append(formatted_line)
-                    except Exception as e:
-                        logger.error(f"Ошибка при обработке события: {str(e)}")
-                        continue
-                
-                if len(processed_lines) >= max_events:
-                    break
-            
-            win32evtlog.CloseEventLog(hand)
-            return processed_lines
-            
-        except Exception as e:
-            logger.error(f"Ошибка при обработке журнала событий {file_path}: {str(e)}", exc_info=True)
-            return []
+    def iter_evtx_log(source, start=0, end=None):
+        # Журнал событий разбирается из самого файла, без Windows API и без ограничения
+        # числа событий; [start, end) — диапазон чанков для параллельного разбора.
+        # Поток члена архива копируется так же, как вложенный архив: чанки читаются по смещениям
+        with contextlib.ExitStack() as stack:
+            if isinstance(source, str):
+                f = stack.enter_context(open(source, 'rb'))
+            else:
+                f = stack.enter_context(tempfile.SpooledTemporaryFile(max_size=NESTED_ARCHIVE_MEMORY_BYTES))
+                shutil.copyfileobj(source, f)
+            if not is_evtx(f):
+                logger.warning(f"Файл {source} не является журналом событий EVTX")
+                return
+            for record in iter_evtx_records(f, start, end):
+                yield format_event(*record)
     
     @staticmethod
-    def parse_json_log(file_path):
-        try:
-            processed_lines = []
-            with open(file_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    try:
-                        log_entry = json.loads(line.strip())
-                        formatted_entry = json.dumps(log_entry, ensure_ascii=False, indent=2)
-                        processed_lines.append(formatted_entry)
-                    except json.JSONDecodeError:
-                        if line.strip():
-                            processed_lines.append(line.strip())
-            return processed_lines
-        except Exception as e:
-            logger.error(f"Ошибка при обработке JSON файла {file_path}: {str(e)}", exc_info=True)
-            return []
+    def open_text(source, encoding='utf-8', newline=None):
+        # Источник — путь к файлу или двоичный поток члена архива
+        if isinstance(source, str):
+            return open(source, 'r', encoding=encoding, errors='replace', newline=newline)
+        return io.TextIOWrapper(source, encoding=encoding, errors='replace', newline=newline)
     
     @staticmethod
-    def parse_csv_log(file_path):
-        try:
-            processed_lines = []
-            with open(file_path, 'r', encoding='utf-8') as f:
-                header = f.readline().strip().split(',')
-                for line in f:
-                    if line.strip():
-                        values = line.strip().split(',')
-                        formatted_line = " | ".join(f"{h}: {v}" for h, v in zip(header, values))
-                        processed_lines.append(formatted_line)
-            return processed_lines
-        except Exception as e:
-            logger.error(f"Ошибка при обработке CSV файла {file_path}: {str(e)}", exc_info=True)
-            return []
+    def source_encoding(source):
+        if isinstance(source, str):
+            return LogProcessor.detect_encoding(source)
+        # У потоков архивов начало берётся через peek, не сдвигая позицию чтения
+        sample = source.peek(ENCODING_SAMPLE_BYTES) if hasattr(source, 'peek') else b''
+        newline = sample.rfind(b'\n')
+        return LogProcessor.sample_encoding(sample[:newline + 1] if newline >= 0 else sample)
     
     @staticmethod
-    def parse_xml_log(file_path):
-        try:
-            import xml.etree.ElementTree as ET
-            processed_lines = []
-            tree = ET.parse(file_path)
-            root = tree.getroot()
-            
-            def process_element(element, level=0):
-                indent = "  " * level
-                tag = element.tag
-                text = element.text.strip() if element.text else ""
-                processed_lines.append(f"{indent}{tag}: {text}")
-                for child in element:
-                    process_element(child, level + 1)
-            
-            process_element(root)
-            return processed_lines
-        except Exception as e:
-            logger.error(f"Ошибка при обработке XML файла {file_path}: {str(e)}", exc_info=True)
-            return []
+    def iter_csv_log(file_path):
+        with LogProcessor.open_text(file_path, LogProcessor.source_encoding(file_path), newline='') as f:
+            yield from CsvReader(f).iter_records()
     
     @staticmethod
-    def parse_yaml_log(file_path):
-        try:
-            import yaml
-            processed_lines = []
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = yaml.safe_load(f)
-                if data:
-                    formatted_data = yaml.dump(data, allow_unicode=True, default_flow_style=False)
-                    processed_lines.append(formatted_data)
-            return processed_lines
-        except Exception as e:
-            logger.error(f"Ошибка при обработке YAML файла {file_path}: {str(e)}", exc_info=True)
-            return []
+    def iter_xml_log(file_path):
+        # Документ читается потоково: каждая запись выдаётся одной строкой сразу после
+        # закрывающего тега и удаляется из дерева, поэтому память не растёт с размером файла.
+        # Запись — элемент LOG_XML_RECORD_TAG или, если он не задан, любой потомок корня
+        import xml.etree.ElementTree as ET
+        record_tag = get_xml_record_tag()
+        
+        def is_record(element, depth):
+            if record_tag:
+                return LogProcessor.xml_local_name(element.tag) == record_tag
+            return depth == 1
+        
+        stack = []
+        open_records = 0
+        emitted = False
+        for event, element in ET.iterparse(file_path, events=('start', 'end')):
+            if event == 'start':
+                stack.append(element)
+                if is_record(element, len(stack) - 1):
+                    open_records += 1
+                continue
+            stack.pop()
+            if is_record(element, len(stack)):
+                open_records -= 1
+                # Вложенные записи с тем же тегом входят во внешнюю
+                if open_records == 0:
+                    yield LogProcessor.format_xml_record(element)
+                    emitted = True
+                    element.clear()
+                    if stack:
+                        stack[-1].remove(element)
+            elif not stack and not emitted:
+                # В документе нет записей: выдаём его целиком
+                yield LogProcessor.format_xml_record(element)
     
     @staticmethod
-    def parse_ini_log(file_path):
-        try:
-            import configparser
-            processed_lines = []
-            config = configparser.ConfigParser()
-            config.read(file_path, encoding='utf-8')
-            
-            for section in config.sections():
-                processed_lines.append(f"[{section}]")
-                for key, value in config.items(section):
-                    processed_lines.append(f"{key} = {value}")
-            return processed_lines
-        except Exception as e:
-            logger.error(f"Ошибка при обработке INI файла {file_path}: {str(e)}", exc_info=True)
-            return []
+    def xml_local_name(tag):
+        return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else ''
     
     @staticmethod
-    def parse_syslog(file_path):
-        try:
-            processed_lines = []
-            with open(file_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        match = re.match(r'<(\d+)>(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}.\d+Z) (\S+) (\S+): (.*)', line.strip())
-                        if match:
-                            priority, timestamp, host, program, message = match.groups()
-                            formatted_line = f"Priority: {priority} | Time: {timestamp} | Host: {host} | Program: {program} | Message: {message}"
-                        else:
-                            formatted_line = line.strip()
-                        processed_lines.append(formatted_line)
-            return processed_lines
-        except Exception as e:
-            logger.error(f"Ошибка при обработке Syslog файла {file_path}: {str(e)}", exc_info=True)
-            return []
+    def format_xml_record(record):
+        # Запись сворачивается в одну строку путей от её корня; обход без рекурсии
+        parts = [LogProcessor.xml_local_name(record.tag)]
+        stack = [(record, '')]
+        while stack:
+            element, path = stack.pop()
+            for key, value in element.attrib.items():
+                parts.append(f"{path}@{LogProcessor.xml_local_name(key)}: {value}")
+            text = (element.text or '').strip()
+            if text:
+                parts.append(f"{path or LogProcessor.xml_local_name(element.tag)}: {text}")
+            for child in reversed(list(element)):
+                name = LogProcessor.xml_local_name(child.tag)
+                stack.append((child, f"{path}/{name}" if path else name))
+        return " | ".join(parts)
+    
+    @staticmethod
+    def iter_yaml_log(file_path):
+        import yaml
+        with LogProcessor.open_text(file_path) as f:
+            data = yaml.safe_load(f)
+        if data:
+            yield yaml.dump(data, allow_unicode=True, default_flow_style=False)
+    
+    @staticmethod
+    def iter_ini_log(file_path):
+        import configparser
+        config = configparser.ConfigParser()
+        with LogProcessor.open_text(file_path) as f:
+            config.read_file(f)
+        
+        for section in config.sections():
+            yield f"[{section}]"
+            for key, value in config.items(section):
+                yield f"{key} = {value}"
+    
+    @staticmethod
+    def iter_text_log(file_path):
+        yield from LogProcessor.iter_mmap_lines(file_path, 0, os.path.getsize(file_path))
+    
+    @staticmethod
+    def detect_encoding(file_path):
+        # Кодировка определяется один раз по началу файла, а не перебором при полном перечитывании
+        with open(file_path, 'rb') as f:
+            return LogProcessor.sample_encoding(f.read(ENCODING_SAMPLE_BYTES))
     
     @staticmethod
-    def extract_archive(archive_path, temp_dir):
+    def sample_encoding(sample):
+        if len(sample) == ENCODING_SAMPLE_BYTES:
+            # Выборка обрезается по строке, чтобы не разрезать многобайтовый символ
+            newline = sample.rfind(b'\n')
+            if newline >= 0:
+                sample = sample[:newline]
+        for encoding in ('utf-8', 'cp1251'):
+            try:
+                sample.decode(encoding)
+                return encoding
+            except UnicodeDecodeError:
+                continue
+        return 'latin1'
+    
+    @staticmethod
+    def iter_mmap_lines(file_path, start, end, encoding=None):
+        # Файл отображается в память и декодируется блоками по границам строк:
+        # в строки Python превращается только текущий блок
+        if end <= start:
+            return
+        if encoding is None:
+            encoding = LogProcessor.detect_encoding(file_path)
+        with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            end = min(end, len(mm))
+            position = start
+            while position < end:
+                block_end = min(end, position + MMAP_BLOCK_BYTES)
+                if block_end < end:
+                    newline = mm.rfind(b'\n', position, block_end)
+                    if newline < 0:
+                        newline = mm.find(b'\n', block_end, end)
+                    block_end = end if newline < 0 else newline + 1
+                block = mm[position:block_end]
+                position = block_end
+                yield from LogProcessor.iter_block_lines(block, encoding)
+    
+    @staticmethod
+    def iter_block_lines(block, encoding):
         try:
-            if not temp_dir:
-                temp_dir = tempfile.mkdtemp()
-            
-            ext = os.path.splitext(archive_path)[1].lower()
-            
-            if ext == '.zip':
-                with zipfile.ZipFile(archive_path, 'r') as zip_ref:
-                    zip_ref.extractall(temp_dir)
-                    return True
-            elif ext in {'.tar', '.gz'}:
-                with tarfile.open(archive_path, 'r:*') as tar_ref:
-                    tar_ref.extractall(temp_dir)
-                    return True
-            elif ext == '.rar':
-                with rarfile.RarFile(archive_path, 'r') as rar_ref:
-                    rar_ref.extractall(temp_dir)
-                    return True
-            else:
-                logger.warning(f"Неподдерживаемый формат архива: {ext}")
-                return False
-                
-        except Exception as e:
-            logger.error(f"Ошибка при распаковке архива {archive_path}: {e}")
-            return False
+            text = block.decode(encoding)
+        except UnicodeDecodeError:
+            # Смешанная кодировка: только этот блок декодируется построчно
+            text = "\n".join(LogProcessor.decode_line(raw) for raw in block.split(b'\n'))
+        for line in text.split('\n'):
+            line = line.strip()
+            if line:
+                yield line
+    
+    @staticmethod
+    def iter_stream_lines(stream):
+        # Тот же разбор блоками для потоков без произвольного доступа (члены архивов)
+        block = stream.read(ENCODING_SAMPLE_BYTES)
+        encoding = LogProcessor.sample_encoding(block)
+        rest = b''
+        while block:
+            data = rest + block
+            cut = data.rfind(b'\n') + 1
+            rest = data[cut:]
+            if cut:
+                yield from LogProcessor.iter_block_lines(data[:cut], encoding)
+            block = stream.read(MMAP_BLOCK_BYTES)
+        if rest:
+            yield from LogProcessor.iter_block_lines(rest, encoding)
+    
+    @staticmethod
+    def decode_line(raw):
+        for encoding in ('utf-8', 'cp1251'):
+            try:
+                return raw.decode(encoding)
+            except UnicodeDecodeError:
+                continue
+        return raw.decode('latin1')
+    
+    @staticmethod
+    def iter_file_range(file_path, start, end):
+        # Разбор построчных форматов с произвольного смещения: используется
+        # для дочитывания дописанных хвостов и параллельного разбора частей больших файлов
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext == '.evtx':
+            yield from LogProcessor.iter_evtx_log(file_path, start, end)
+            return
+        # Формат определяется по началу файла, а не части: так все части разбираются одинаково
+        line_format = LogProcessor.detect_file_format(file_path)
+        yield from line_format.format_lines(LogProcessor.iter_mmap_lines(file_path, start, end))
+    
+    @staticmethod
+    def detect_file_format(file_path):
+        ext = os.path.splitext(file_path)[1].lower()
+        head = LogProcessor.iter_mmap_lines(file_path, 0, min(os.path.getsize(file_path), ENCODING_SAMPLE_BYTES))
+        return detect_format(list(itertools.islice(head, SNIFF_LINES)), ext)
+    
+    @staticmethod
+    def iter_source_lines(name, source):
+        # Единый путь разбора для файлов и членов архивов: документные форматы выбираются
+        # по расширению, построчные — по содержимому первых строк
+        ext = os.path.splitext(name)[1].lower()
+        parser = DOCUMENT_PARSERS.get(ext)
+        if parser is not None:
+            logger.debug(f"Обработка файла {name}: {parser}")
+            yield from getattr(LogProcessor, parser)(source)
+            return
+        if isinstance(source, str):
+            lines = LogProcessor.iter_text_log(source)
+        else:
+            lines = LogProcessor.iter_stream_lines(source)
+        line_format, lines = iter_formatted_lines(lines, ext)
+        logger.debug(f"Формат файла {name}: {line_format.name}")
+        yield from lines
+    
+    @staticmethod
+    def iter_archive_members(source, archive_name=None):
+        # Члены архива отдаются как потоки без распаковки на диск; поток действителен
+        # только до перехода к следующему члену. source — путь или поток с произвольным доступом
+        archive_name = archive_name or source
+        ext = os.path.splitext(archive_name)[1].lower()
+        if ext == '.zip':
+            with zipfile.ZipFile(source, 'r') as archive:
+                for info in archive.infolist():
+                    if not info.is_dir():
+                        with archive.open(info) as stream:
+                            yield info.filename, stream
+        elif ext in {'.tar', '.gz'}:
+            try:
+                if isinstance(source, str):
+                    archive = tarfile.open(source, 'r|*')
+                else:
+                    archive = tarfile.open(fileobj=source, mode='r|*')
+            except tarfile.ReadError:
+                if ext != '.gz':
+                    raise
+                # Одиночный сжатый файл, например app.log.gz
+                if not isinstance(source, str):
+                    source.seek(0)
+                with gzip.open(source, 'rb') as stream:
+                    yield os.path.basename(archive_name)[:-3], stream
+                return
+            with archive:
+                for member in archive:
+                    if member.isfile():
+                        with archive.extractfile(member) as stream:
+                            yield member.name, stream
+        elif ext == '.rar':
+            with rarfile.RarFile(source, 'r') as archive:
+                for info in archive.infolist():
+                    if not info.is_dir():
+                        with archive.open(info) as stream:
+                            yield info.filename, stream
+        else:
+            logger.warning(f"Неподдерживаемый формат архива: {ext}")
+    
+    @staticmethod
+    def iter_member_lines(name, stream, supported_extensions=SUPPORTED_EXTENSIONS,
+                          supported_archives=SUPPORTED_ARCHIVES, depth=0):
+        ext = os.path.splitext(name)[1].lower()
+        if ext in supported_archives:
+            if depth >= MAX_ARCHIVE_DEPTH:
+                logger.warning(f"Пропущен архив {name}: превышена глубина вложенности")
+                return
+            # zip и rar требуют произвольного доступа: вложенный архив копируется
+            # в память, а крупный — во временный файл
+            with tempfile.SpooledTemporaryFile(max_size=NESTED_ARCHIVE_MEMORY_BYTES) as nested:
+                shutil.copyfileobj(stream, nested)
+                nested.seek(0)
+                yield from LogProcessor.iter_archive_lines(nested, supported_extensions, supported_archives,
+                                                           name, depth + 1)
+        else:
+            yield from LogProcessor.iter_source_lines(name, stream)
+    
+    @staticmethod
+    def iter_archive_lines(source, supported_extensions, supported_archives=SUPPORTED_ARCHIVES,
+                           archive_name=None, depth=0):
+        # Повреждённый член архива пропускается, остальные разбираются; ошибка
+        # поднимается в конце, чтобы архив не попал в кэш разбора неполным
+        archive_name = archive_name or source
+        failed = 0
+        for name, stream in LogProcessor.iter_archive_members(source, archive_name):
+            ext = os.path.splitext(name)[1].lower()
+            if ext not in supported_extensions and ext not in supported_archives:
+                continue
+            try:
+                yield from LogProcessor.iter_member_lines(name, stream, supported_extensions,
+                                                          supported_archives, depth)
+            except Exception as e:
+                failed += 1
+                logger.error(f"Ошибка при чтении файла {name} из архива {archive_name}: {str(e)}")
+        if failed:
+            raise RuntimeError(f"Не удалось прочитать файлов из архива {archive_name}: {failed}")
+    
+    @staticmethod
+    def iter_archive_member(archive_path, member, supported_extensions, supported_archives):
+        # Один член архива, выданный процессу пула отдельной задачей
+        kind, name = member[0], member[1]
+        if kind == 'zip':
+            with zipfile.ZipFile(archive_path, 'r') as archive, archive.open(name) as stream:
+                yield from LogProcessor.iter_member_lines(name, stream, supported_extensions, supported_archives)
+        elif kind == 'rar':
+            with rarfile.RarFile(archive_path, 'r') as archive, archive.open(name) as stream:
+                yield from LogProcessor.iter_member_lines(name, stream, supported_extensions, supported_archives)
+        else:
+            offset, size = member[2], member[3]
+            with open(archive_path, 'rb') as f:
+                stream = io.BufferedReader(FileSection(f, offset, size), MMAP_BLOCK_BYTES)
+                yield from LogProcessor.iter_member_lines(name, stream, supported_extensions, supported_archives)
     
     def get_files_to_process(self, directory):
         files_to_process = []
@@ -268,111 +552,302 @@ class LogProcessor(QThread):
             return []
     
     @staticmethod
-    def process_file_parallel(file_path, supported_extensions, supported_archives, temp_dir=None):
+    def iter_file_lines(file_path, supported_extensions, supported_archives):
+        # Ошибки разбора не перехватываются: задача пула завершается неуспешно,
+        # и частично разобранный файл не попадает в кэш разбора
+        ext = os.path.splitext(file_path)[1].lower()
+        
+        if ext in supported_archives:
+            logger.debug(f"Обработка архива: {file_path}")
+            yield from LogProcessor.iter_archive_lines(file_path, supported_extensions, supported_archives)
+            return
+        
+        yield from LogProcessor.iter_source_lines(file_path, file_path)
+    
+    @staticmethod
+    def iter_line_chunks(lines_iter, chunk_bytes):
+        chunk = []
+        size = 0
         try:
-            if not os.path.exists(file_path):
-                logger.error(f"Файл не существует: {file_path}")
-                return []
-            
+            for line in lines_iter:
+                chunk.append(line)
+                size += len(line) + 1
+                if size >= chunk_bytes:
+                    yield chunk
+                    chunk = []
+                    size = 0
+        except Exception:
+            # Строки, разобранные до ошибки, уходят на анализ; ошибка — дальше, в задачу
+            if chunk:
+                yield chunk
+            raise
+        if chunk:
+            yield chunk
+    
+    def _plan_tasks(self, files_to_process):
+        # Задачи для пула: ((путь, start, end), job, part); start=None — разбор файла целиком.
+        # job — общее описание результата для всех частей одного файла: порядок
+        # склейки частей и то, как сохранить результат в кэш разбора
+        tasks = []
+        cached_files = []
+        for file_path in files_to_process:
             ext = os.path.splitext(file_path)[1].lower()
-            
-            if ext == '.evtx':
-                logger.debug(f"Обработка файла .evtx: {file_path}")
-                return LogProcessor.process_evtx_file(file_path)
-            
-            if ext in {'.json', '.jsonl'}:
-                logger.debug(f"Обработка JSON файла: {file_path}")
-                return LogProcessor.parse_json_log(file_path)
-            
-            if ext == '.csv':
-                logger.debug(f"Обработка CSV файла: {file_path}")
-                return LogProcessor.parse_csv_log(file_path)
-            
-            if ext == '.xml':
-                logger.debug(f"Обработка XML файла: {file_path}")
-                return LogProcessor.parse_xml_log(file_path)
-            
-            if ext in {'.yaml', '.yml'}:
-                logger.debug(f"Обработка YAML файла: {file_path}")
-                return LogProcessor.parse_yaml_log(file_path)
-            
-            if ext in {'.ini', '.conf'}:
-                logger.debug(f"Обработка INI файла: {file_path}")
-                return LogProcessor.parse_ini_log(file_path)
-            
-            if ext == '.syslog':
-                logger.debug(f"Обработка Syslog файла: {file_path}")
-                return LogProcessor.parse_syslog(file_path)
-            
-            if ext in supported_archives:
-                logger.debug(f"Обработка архива: {file_path}")
-                
-                if LogProcessor.extract_archive(file_path, temp_dir):
-                    processed_lines = []
-                    for root, _, files in os.walk(temp_dir):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            file_ext = os.path.splitext(file)[1].lower()
-                            
-                            if file_ext in supported_extensions:
-                                try:
-                                    if file_ext == '.evtx':
-                                        processed_lines.extend(LogProcessor.process_evtx_file(file_path))
-                                    elif file_ext in {'.json', '.jsonl'}:
-                                        processed_lines.extend(LogProcessor.parse_json_log(file_path))
-                                    elif file_ext == '.csv':
-                                        processed_lines.extend(LogProcessor.parse_csv_log(file_path))
-                                    elif file_ext == '.xml':
-                                        processed_lines.extend(LogProcessor.parse_xml_log(file_path))
-                                    elif file_ext in {'.yaml', '.yml'}:
-                                        processed_lines.extend(LogProcessor.parse_yaml_log(file_path))
-                                    elif file_ext in {'.ini', '.conf'}:
-                                        processed_lines.extend(LogProcessor.parse_ini_log(file_path))
-                                    elif file_ext == '.syslog':
-                                        processed_lines.extend(LogProcessor.parse_syslog(file_path))
-                                    else:
-                                        with open(file_path, 'r', encoding='utf-8') as f:
-                                            lines = f.readlines()
-                                            for line in lines:
-                                                line = line.strip()
-                                                if line:
-                                                    processed_lines.append(line)
-                                except Exception as e:
-                                    logger.error(f"Ошибка при чтении файла {file}: {str(e)}")
-                    
-                    return processed_lines
-                else:
-                    logger.warning(f"Не удалось распаковать архив: {file_path}")
-                    return []
-            
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    lines = f.readlines()
-            except UnicodeDecodeError:
-                encodings = ['cp1251', 'latin1', 'ascii']
-                for encoding in encodings:
+            appendable = ext in APPENDABLE_EXTENSIONS
+            # Журнал событий не дописывается построчно, но делится на независимые чанки
+            ranged = appendable or ext == '.evtx'
+            if self.manifest is None:
+                if ranged:
                     try:
-                        with open(file_path, 'r', encoding=encoding) as f:
-                            lines = f.readlines()
-                        break
-                    except UnicodeDecodeError:
+                        self._add_job(tasks, file_path, 0, os.path.getsize(file_path), None)
                         continue
+                    except OSError as e:
+                        logger.warning(f"Не удалось определить размер файла {file_path}: {e}")
+                self._add_job(tasks, file_path, None, None, None, members=self._archive_members(file_path))
+                continue
+            try:
+                action, start, end, stat = self.manifest.plan(file_path, appendable)
+            except OSError as e:
+                logger.warning(f"Не удалось проверить файл {file_path} по манифесту: {e}")
+                self._add_job(tasks, file_path, None, None, None)
+                continue
+            
+            if action in {'reuse', 'append'}:
+                cached_files.append(file_path)
+            # Незавершённая последняя строка разбирается последней частью, но не кэшируется
+            tail_end = stat.st_size if appendable and stat.st_size > end and self.replay_cached else None
+            if action != 'reuse':
+                cache = {'stat': stat, 'offset': end, 'append': action == 'append',
+                         'silent': action == 'full' and not self.replay_cached and self._seen_before(file_path, appendable)}
+                if ranged:
+                    self._add_job(tasks, file_path, start, end, cache, tail_end)
                 else:
-                    logger.error(f"Не удалось прочитать файл {file_path}: неподдерживаемая кодировка")
-                    return []
-            
-            processed_lines = []
-            for line in lines:
-                line = line.strip()
-                if line:
-                    processed_lines.append(line)
-            
-            return processed_lines
+                    self._add_job(tasks, file_path, None, None, cache, members=self._archive_members(file_path))
+            elif tail_end is not None:
+                self._add_job(tasks, file_path, end, tail_end, None)
+        # Крупные файлы запускаются первыми: иначе последний большой файл
+        # обрабатывается одним процессом, пока остальные простаивают
+        tasks.sort(key=self._task_size, reverse=True)
+        return tasks, cached_files
+    
+    def _seen_before(self, file_path, appendable):
+        # Режим слежения: переписанный целиком документ и ротированная копия
+        # отслеживаемого лога (app.log.1.gz) содержат уже выданные строки —
+        # они разбираются только в кэш, чтобы не уйти на анализ повторно.
+        # Усечённый при ротации дописываемый лог начинается с новых строк
+        if file_path in self.manifest:
+            return not appendable
+        base = rotation_base(file_path)
+        return base is not None and os.path.join(os.path.dirname(file_path), base) in self.manifest
+    
+    def _add_job(self, tasks, file_path, start, end, cache, tail_end=None, members=None):
+        if members:
+            ranges = [(None, None)] * len(members)
+        elif start is None:
+            ranges = [(None, None)]
+        else:
+            ranges = self._split_range(file_path, start, end)
+        cached_parts = len(ranges) if cache is not None else 0
+        if tail_end is not None:
+            ranges.append((end, tail_end))
+        job = {'file_path': file_path, 'cache': cache, 'parts': len(ranges), 'cached_parts': cached_parts,
+               'next': 0, 'done': set(), 'task_ids': [None] * len(ranges), 'pending': {},
+               'count': 0, 'cached_count': 0, 'ok': True, 'output': None,
+               'members': [spec for spec, _ in members] if members else None,
+               'sizes': [size for _, size in members] if members else None}
+        for part, (part_start, part_end) in enumerate(ranges):
+            tasks.append(((file_path, part_start, part_end), job, part))
+    
+    def _archive_members(self, file_path):
+        # Члены архива раздаются процессам как отдельные задачи: (описание члена, размер).
+        # Пустой список — архив разбирается одной задачей
+        ext = os.path.splitext(file_path)[1].lower()
+        if self.num_processes < 2 or ext not in self.supported_archives:
+            return []
+        
+        def wanted(name):
+            member_ext = os.path.splitext(name)[1].lower()
+            return member_ext in self.supported_extensions or member_ext in self.supported_archives
         
+        try:
+            if ext == '.zip':
+                with zipfile.ZipFile(file_path, 'r') as archive:
+                    return [(('zip', info.filename), info.file_size) for info in archive.infolist()
+                            if not info.is_dir() and wanted(info.filename)]
+            if ext == '.rar':
+                with rarfile.RarFile(file_path, 'r') as archive:
+                    return [(('rar', info.filename), info.file_size) for info in archive.infolist()
+                            if not info.is_dir() and wanted(info.filename)]
+            try:
+                # Несжатый tar: процессы читают члены напрямую по смещению
+                with tarfile.open(file_path, 'r:') as archive:
+                    return [(('tar', member.name, member.offset_data, member.size), member.size)
+                            for member in archive.getmembers() if member.isfile() and wanted(member.name)]
+            except tarfile.ReadError:
+                # Сжатый tar не позволяет читать члены по отдельности, а его распаковка
+                # до запуска пула шла бы последовательно: он читается потоком одной задачей
+                return []
         except Exception as e:
-            logger.error(f"Ошибка при обработке файла {file_path}: {str(e)}", exc_info=True)
+            logger.warning(f"Не удалось получить список файлов архива {file_path}, он будет разобран целиком: {e}")
             return []
     
+    def _split_range(self, file_path, start, end):
+        # Большой построчный файл режется на части, которые разбираются параллельно;
+        # граница части сдвигается вперёд до ближайшего перевода строки
+        if end - start <= self.split_bytes:
+            return [(start, end)]
+        if os.path.splitext(file_path)[1].lower() == '.evtx':
+            # Части журнала событий состоят из целых чанков
+            step = max(1, self.split_bytes // CHUNK_SIZE) * CHUNK_SIZE
+            bounds = list(range(start, end, step)) if start >= FILE_HEADER_SIZE else \
+                [start] + list(range(FILE_HEADER_SIZE + step, end, step))
+            logger.debug(f"Журнал {file_path} разбит на {len(bounds)} частей для параллельного разбора")
+            return list(zip(bounds, bounds[1:] + [end]))
+        bounds = [start]
+        with open(file_path, 'rb') as f:
+            position = start + self.split_bytes
+            while position < end:
+                f.seek(position - 1)
+                f.readline()
+                position = f.tell()
+                if position >= end:
+                    break
+                bounds.append(position)
+                position += self.split_bytes
+        bounds.append(end)
+        logger.debug(f"Файл {file_path} разбит на {len(bounds) - 1} частей для параллельного разбора")
+        return list(zip(bounds, bounds[1:]))
+    
+    @staticmethod
+    def _task_size(task):
+        (file_path, start, end), job, part = task
+        if job['sizes']:
+            return job['sizes'][part]
+        if start is not None:
+            return end - start
+        try:
+            return os.path.getsize(file_path)
+        except OSError:
+            return 0
+    
+    def _emit_lines(self, job, part, lines):
+        if part < job['cached_parts']:
+            if job['output'] is None:
+                job['output'] = self.manifest.open_output(job['file_path'], job['cache']['append'])
+            self.manifest.write_lines(job['output'], lines)
+            if job['cache']['silent']:
+                return
+        yield job['file_path'], lines, None
+    
+    def _spill_path(self, task_id):
+        return os.path.join(self.spill_dir, f"{task_id}.bin")
+    
+    def _remove_spill(self, task_id):
+        self._remove_file(self._spill_path(task_id))
+    
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    
+    def _finish_job(self, job):
+        cache = job['cache']
+        if cache is not None:
+            output = job['output'] or self.manifest.open_output(job['file_path'], cache['append'])
+            output.close(job['ok'])
+            job['output'] = None
+            if job['ok']:
+                self.manifest.commit(job['file_path'], cache['stat'], cache['offset'], job['cached_count'],
+                                     cache['append'])
+        return job['file_path'], None, job['count']
+    
+    def iter_chunks(self, files_to_process):
+        # Каталог запуска: файлы результатов задач
+        self.spill_dir = tempfile.mkdtemp(prefix="chunks_", dir=self.temp_dir)
+        try:
+            yield from self._iter_chunks(files_to_process)
+        finally:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+    
+    def _iter_chunks(self, files_to_process):
+        tasks, cached_files = self._plan_tasks(files_to_process)
+        if cached_files:
+            logger.debug(f"Из кэша разбора: {len(cached_files)} файлов, задач для разбора: {len(tasks)}")
+        
+        for file_path in cached_files if self.replay_cached else []:
+            count = 0
+            for lines in self.manifest.iter_cached(file_path, self.chunk_bytes):
+                count += len(lines)
+                yield file_path, lines, None
+            yield file_path, None, count
+        
+        if not tasks:
+            return
+        
+        # Рабочие процессы пишут порции в файлы задач, а через ограниченную очередь
+        # передают только их координаты; при её заполнении они ждут родителя
+        stream_queue = Queue(maxsize=self.queue_size)
+        jobs = {id(job): job for _, job, _ in tasks}.values()
+        for task_id, (_, job, part) in enumerate(tasks):
+            job['task_ids'][part] = task_id
+        processes = min(self.num_processes, len(tasks))
+        logger.debug(f"Задач для разбора: {len(tasks)}, процессов: {processes}")
+        try:
+            # chunksize=1: свободный процесс сразу забирает следующую задачу из общей
+            # очереди, а результаты приходят в порядке готовности, а не отправки
+            with Pool(processes=processes, initializer=init_stream_worker, initargs=(stream_queue,)) as pool:
+                args = [
+                    (task_id, file_path, start, end, job['members'][part] if job['members'] else None,
+                     self.supported_extensions, self.supported_archives, self.chunk_bytes, self._spill_path(task_id))
+                    for task_id, ((file_path, start, end), job, part) in enumerate(tasks)
+                ]
+                async_result = pool.map_async(stream_file_worker, args, chunksize=1)
+                pending = len(tasks)
+                while pending:
+                    try:
+                        task_id, record, result = stream_queue.get(timeout=0.5)
+                    except queue.Empty:
+                        if async_result.ready() and not async_result.successful():
+                            async_result.get()
+                        continue
+                    _, job, part = tasks[task_id]
+                    
+                    if record is not None:
+                        if part == job['next']:
+                            yield from self._emit_lines(job, part, read_spill_chunk(self._spill_path(task_id), record))
+                        else:
+                            # Часть пришла раньше предыдущих: её порции остаются в файле задачи
+                            job['pending'].setdefault(part, []).append(record)
+                        continue
+                    
+                    pending -= 1
+                    count, ok = result
+                    job['count'] += count
+                    if part < job['cached_parts']:
+                        job['cached_count'] += count
+                    job['ok'] = job['ok'] and ok
+                    job['done'].add(part)
+                    # Следующая по порядку часть становится текущей: сначала
+                    # выдаётся то, что она успела прислать, дальше — напрямую
+                    while job['next'] in job['done']:
+                        self._remove_spill(job['task_ids'][job['next']])
+                        job['next'] += 1
+                        if job['next'] < job['parts']:
+                            next_task_id = job['task_ids'][job['next']]
+                            for record in job['pending'].pop(job['next'], []):
+                                yield from self._emit_lines(job, job['next'], read_spill_chunk(self._spill_path(next_task_id), record))
+                    if job['next'] == job['parts']:
+                        yield self._finish_job(job)
+        finally:
+            # Прерванные задачи: записанное ими в кэш разбора откатывается
+            for job in jobs:
+                if job['output'] is not None:
+                    job['output'].close()
+        
+        if self.manifest is not None:
+            self.manifest.save()
+    
     def run(self):
         try:
             logger.debug(f"Запуск обработки для папки: {self.folder_path}")
@@ -387,19 +862,39 @@ class LogProcessor(QThread):
             
             self.temp_dir = tempfile.mkdtemp()
             
-            all_lines = []
+            if self.incremental:
+                try:
+                    self.manifest = FileManifest(os.getenv('LOG_PARSE_CACHE_DIR', DEFAULT_PARSE_CACHE_DIR),
+                                                 options=parse_options())
+                except Exception as e:
+                    logger.error(f"Не удалось открыть манифест, файлы будут разобраны полностью: {e}", exc_info=True)
             
-            with Pool(processes=self.num_processes) as pool:
-                results = []
-                for file_path in files_to_process:
-                    self.progress.emit(f"Обрабатываем файл: {os.path.basename(file_path)}")
-                    args = (file_path, self.supported_extensions, self.supported_archives, self.temp_dir)
-                    results.append(pool.apply_async(process_file_wrapper, (args,)))
-                
-                for result in results:
-                    lines = result.get()
+            if self.streaming:
+                buffer = LogBuffer(memory_limit=self.memory_limit // 2)
+            else:
+                all_lines = []
+            
+            preview_lines = 0
+            for file_path, lines, count in self.iter_chunks(files_to_process):
+                if lines is None:
+                    self.progress.emit(f"Обработан файл {os.path.basename(file_path)}: {count} строк")
+                    continue
+                if self.streaming:
+                    buffer.append(lines)
+                    # Сигнал копирует список в очередь событий интерфейса:
+                    # после заполнения предпросмотра строки туда не передаются
+                    if preview_lines < PREVIEW_LINES:
+                        shown = lines[:PREVIEW_LINES - preview_lines]
+                        preview_lines += len(shown)
+                        self.chunk.emit(shown)
+                else:
                     all_lines.extend(lines)
-                    self.progress.emit(f"Обработано {len(lines)} строк")
+            
+            if self.streaming:
+                logger.debug(f"Обработано {buffer.line_count} строк, сброс на диск: {buffer.spilled}")
+                logger.debug("Обработка завершена")
+                self.finished.emit(buffer)
+                return
             
             logger.debug(f"Обработано {len(all_lines)} строк")
             
@@ -410,4 +905,4 @@ class LogProcessor(QThread):
         except Exception as e:
             error_msg = f"Ошибка при обработке: {str(e)}"
             logger.error(error_msg, exc_info=True)
-            self.error.emit(error_msg) 
\ No newline at end of file
+            self.error.emit(error_msg)
@@ -0,0 +1,171 @@
+import re
+from core.constants import logger, get_env_int
+
+# Поиск шаблонов строк по алгоритму Drain: строки группируются по числу токенов
+# и первым токенам, внутри группы — по доле совпадающих токенов с шаблоном
+DEFAULT_SIMILARITY_PERCENT = 40
+DEFAULT_PREFIX_TOKENS = 2
+DEFAULT_MAX_CHILDREN = 100
+DEFAULT_MAX_TEMPLATES = 10000
+DEFAULT_EXAMPLES = 1
+# Строки, совпадающие после маскирования, берутся из словаря без обхода дерева
+MAX_CACHED_LINES = 100000
+WILDCARD = '<*>'
+
+# Переменные части маскируются до сравнения, чтобы строки с разными
+# идентификаторами, адресами и числами сразу попадали в один шаблон.
+# Варианты проверяются только с начала слова, а не с каждой позиции строки
+MASK_PATTERN = re.compile(
+    r'(?<![\w.])(?:(?P<UUID>[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})'
+    r'|(?P<IP>\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?)'
+    r'|(?P<HEX>0[xX][0-9a-fA-F]+|[0-9a-fA-F]{16,})'
+    r'|(?P<NUM>[-+]?\d+(?:[.,:]\d+)*))(?![\w.])'
+)
+
+def mask_line(line):
+    return MASK_PATTERN.sub(lambda match: f"<{match.lastgroup}>", line)
+
+def has_mask(token):
+    return token == WILDCARD or (token.startswith('<') and token.endswith('>') and token[1:-1].isupper())
+
+class LogTemplate:
+    """Шаблон строк: токены с местами параметров, число строк и примеры"""
+
+    __slots__ = ('tokens', 'count', 'examples', 'first_line')
+
+    def __init__(self, tokens, line, index, max_examples):
+        self.tokens = tokens
+        self.count = 0
+        self.examples = []
+        self.first_line = index
+        self.add(tokens, line, max_examples)
+
+    @property
+    def text(self):
+        return " ".join(self.tokens)
+
+    def similarity(self, tokens):
+        # Доля совпадающих токенов; места параметров не считаются совпадением,
+        # чтобы шаблон из одних <*> не поглощал всё подряд
+        same = 0
+        for template_token, token in zip(self.tokens, tokens):
+            if template_token == token and template_token != WILDCARD:
+                same += 1
+        return same / len(tokens)
+
+    def add(self, tokens, line, max_examples):
+        if self.count:
+            self.tokens = [template_token if template_token == token else WILDCARD
+                           for template_token, token in zip(self.tokens, tokens)]
+        self.hit(line, max_examples)
+
+    def hit(self, line, max_examples):
+        # Строка, которая уже совпадала с шаблоном: сам шаблон не меняется
+        self.count += 1
+        if len(self.examples) < max_examples and line not in self.examples:
+            self.examples.append(line)
+
+class TemplateMiner:
+    """Сжатие корпуса логов до шаблонов строк с числом повторений.
+
+    Дерево разбора: число токенов → первые токены → список шаблонов.
+    Строка добавляется к самому похожему шаблону листа, если доля
+    совпадающих токенов не ниже порога, иначе образует новый шаблон.
+    Число шаблонов ограничено: после предела новые строки без подходящего
+    шаблона только подсчитываются.
+    """
+
+    def __init__(self, similarity=DEFAULT_SIMILARITY_PERCENT / 100, prefix_tokens=DEFAULT_PREFIX_TOKENS,
+                 max_children=DEFAULT_MAX_CHILDREN, max_templates=DEFAULT_MAX_TEMPLATES, examples=DEFAULT_EXAMPLES):
+        self.similarity = similarity
+        self.prefix_tokens = prefix_tokens
+        self.max_children = max_children
+        self.max_templates = max_templates
+        self.examples = examples
+        self.tree = {}
+        self.cache = {}
+        self.templates = []
+        self.line_count = 0
+        self.overflow = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            similarity=get_env_int('LOG_TEMPLATE_SIMILARITY', DEFAULT_SIMILARITY_PERCENT) / 100,
+            max_templates=max(1, get_env_int('LOG_TEMPLATE_MAX', DEFAULT_MAX_TEMPLATES)),
+            examples=max(0, get_env_int('LOG_TEMPLATE_EXAMPLES', DEFAULT_EXAMPLES))
+        )
+
+    def _leaf(self, tokens):
+        node = self.tree.setdefault(len(tokens), {})
+        for token in tokens[:self.prefix_tokens]:
+            # Токены с параметрами и переполненные узлы уходят в общую ветвь <*>
+            if has_mask(token) or any(char.isdigit() for char in token):
+                token = WILDCARD
+            child = node.get(token)
+            if child is None:
+                if len(node) >= self.max_children:
+                    token = WILDCARD
+                    child = node.get(token)
+                if child is None:
+                    child = node[token] = {}
+            node = child
+        return node.setdefault(None, [])
+
+    def add(self, line):
+        index = self.line_count
+        self.line_count += 1
+        masked = mask_line(line)
+        template = self.cache.get(masked)
+        if template is not None:
+            template.hit(line, self.examples)
+            return template
+        tokens = masked.split()
+        if not tokens:
+            return None
+        template = self._match(tokens, line, index)
+        if template is not None:
+            if len(self.cache) >= MAX_CACHED_LINES:
+                self.cache.clear()
+            self.cache[masked] = template
+        return template
+
+    def _match(self, tokens, line, index):
+        leaf = self._leaf(tokens)
+        best = None
+        best_similarity = -1.0
+        for template in leaf:
+            similarity = template.similarity(tokens)
+            if similarity > best_similarity:
+                best, best_similarity = template, similarity
+        if best is not None and best_similarity >= self.similarity:
+            best.add(tokens, line, self.examples)
+            return best
+        if len(self.templates) >= self.max_templates:
+            self.overflow += 1
+            return None
+        template = LogTemplate(tokens, line, index, self.examples)
+        leaf.append(template)
+        self.templates.append(template)
+        return template
+
+    def add_lines(self, lines):
+        for line in lines:
+            self.add(line)
+        logger.debug(f"Найдено шаблонов: {len(self.templates)} на {self.line_count} строк")
+        return self
+
+    def summary_lines(self, order=None, shown=()):
+        # «число × шаблон» и примеры строк для шаблонов с параметрами;
+        # по умолчанию сначала самые частые. Строки из shown уже есть
+        # в промпте и примерами не повторяются
+        templates = order if order is not None else sorted(self.templates, key=lambda t: (-t.count, t.first_line))
+        lines = []
+        for template in templates:
+            lines.append(f"{template.count} × {template.text}")
+            if template.examples and template.examples[0] != template.text:
+                lines.extend(f"    пример: {example}" for example in template.examples
+                             if example not in shown)
+        if self.overflow:
+            lines.append(f"{self.overflow} × (строки вне шаблонов: достигнут предел LOG_TEMPLATE_MAX)")
+        return lines
@@ -0,0 +1,193 @@
+import os
+import json
+import hashlib
+import threading
+from core.constants import logger
+
+DEFAULT_PARSE_CACHE_DIR = "./parse_cache"
+# Увеличивается при изменении формата вывода парсеров: старый кэш становится недействительным
+PARSER_VERSION = 9
+# Сравниваются начало и конец разобранной части файла
+HASH_BLOCK_BYTES = 64 * 1024
+
+class CacheOutput:
+    """Кэш разобранных строк одного файла, открытый на запись.
+
+    Полный разбор пишется во временный файл и заменяет прежний кэш только
+    при успешном закрытии; дописанный хвост при ошибке отрезается до
+    прежнего размера, чтобы строки не попали в кэш дважды.
+    """
+
+    def __init__(self, path, append):
+        self.path = path
+        self.append = append
+        self.size = os.path.getsize(path) if append and os.path.exists(path) else 0
+        self._file = open(path if append else path + ".tmp", 'a' if append else 'w', encoding='utf-8')
+
+    def write(self, text):
+        self._file.write(text)
+
+    def close(self, ok=False):
+        if self._file.closed:
+            return
+        self._file.close()
+        if self.append:
+            if not ok:
+                os.truncate(self.path, self.size)
+        elif ok:
+            os.replace(self.path + ".tmp", self.path)
+        else:
+            os.remove(self.path + ".tmp")
+
+class FileManifest:
+    """Манифест обработанных файлов для инкрементального повторного анализа.
+
+    Для каждого файла хранятся размер, время изменения, хэш начала и конца
+    разобранной части, смещение, до которого он разобран, и путь к кэшу
+    разобранных строк.
+    Неизменившиеся файлы берутся из кэша целиком, у дописываемых логов
+    разбирается только добавленный хвост.
+    """
+
+    def __init__(self, directory=DEFAULT_PARSE_CACHE_DIR, options=None):
+        self.directory = directory
+        # Настройки разбора, от которых зависит вывод: при их смене кэш сбрасывается
+        self.options = json.loads(json.dumps(options or {}))
+        self.path = os.path.join(directory, "manifest.json")
+        self.entries = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") != PARSER_VERSION or data.get("options", {}) != self.options:
+                logger.debug("Версия или настройки парсеров изменились, кэш разбора сброшен")
+                return
+            self.entries = data.get("files", {})
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать манифест {self.path}, он будет пересоздан: {e}")
+
+    def __contains__(self, file_path):
+        return os.path.abspath(file_path) in self.entries
+
+    def save(self):
+        with self._lock:
+            # Записи удалённых файлов и их кэш больше не нужны
+            for file_path in [path for path in self.entries if not os.path.exists(path)]:
+                self._drop_output(self.entries.pop(file_path))
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": PARSER_VERSION, "options": self.options, "files": self.entries}, f,
+                          ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def content_hash(file_path, length):
+        # Первый и последний блоки [0, length): перезапись на месте с тем же размером
+        # и временем изменения или правка хвоста большого файла меняют хэш
+        digest = hashlib.sha1(str(length).encode('ascii'))
+        with open(file_path, 'rb') as f:
+            digest.update(f.read(min(length, HASH_BLOCK_BYTES)))
+            if length > HASH_BLOCK_BYTES:
+                tail = max(HASH_BLOCK_BYTES, length - HASH_BLOCK_BYTES)
+                f.seek(tail)
+                digest.update(f.read(length - tail))
+        return digest.hexdigest()
+
+    @staticmethod
+    def last_line_end(file_path, size):
+        # Смещение сразу после последнего перевода строки: дальше — незавершённая строка
+        block_size = 64 * 1024
+        with open(file_path, 'rb') as f:
+            position = size
+            while position > 0:
+                start = max(0, position - block_size)
+                f.seek(start)
+                block = f.read(position - start)
+                index = block.rfind(b'\n')
+                if index >= 0:
+                    return start + index + 1
+                position = start
+        return 0
+
+    def _output_path(self, file_path):
+        name = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{name}.jsonl")
+
+    def _drop_output(self, entry):
+        output = entry.get("output")
+        if output and os.path.exists(output):
+            try:
+                os.remove(output)
+            except OSError as e:
+                logger.warning(f"Не удалось удалить кэш разбора {output}: {e}")
+
+    def plan(self, file_path, appendable):
+        """Решение для файла: (действие, start, end, stat).
+
+        Действие — 'reuse', 'append' или 'full'. end — граница, до которой
+        разобранный вывод можно кэшировать; для дописываемых логов это конец
+        последней завершённой строки.
+        """
+        stat = os.stat(file_path)
+        size = stat.st_size
+        entry = self.entries.get(os.path.abspath(file_path))
+        if entry and not os.path.exists(entry.get("output", "")):
+            entry = None
+        if not entry:
+            end = self.last_line_end(file_path, size) if appendable else size
+            return 'full', 0, end, stat
+        offset = entry["offset"]
+        same_content = size >= offset and self.content_hash(file_path, offset) == entry["content_hash"]
+        # Размер и время изменения совпали — остальное не читается: режим
+        # слежения опрашивает неизменившиеся файлы каждые несколько секунд
+        if same_content and size == entry["size"] and stat.st_mtime == entry["mtime"]:
+            return 'reuse', offset, offset, stat
+
+        end = self.last_line_end(file_path, size) if appendable else size
+        if appendable and same_content and end >= offset:
+            return 'append', offset, end, stat
+        return 'full', 0, end, stat
+
+    def iter_cached(self, file_path, chunk_bytes):
+        entry = self.entries.get(os.path.abspath(file_path))
+        chunk = []
+        size = 0
+        with open(entry["output"], 'r', encoding='utf-8') as f:
+            for row in f:
+                line = json.loads(row)
+                chunk.append(line)
+                size += len(line) + 1
+                if size >= chunk_bytes:
+                    yield chunk
+                    chunk = []
+                    size = 0
+        if chunk:
+            yield chunk
+
+    def open_output(self, file_path, append):
+        # Строки хранятся в JSON-кодировке: разобранная запись может содержать переводы строк
+        return CacheOutput(self._output_path(file_path), append)
+
+    @staticmethod
+    def write_lines(output, lines):
+        output.write("".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines))
+
+    def commit(self, file_path, stat, offset, lines, append):
+        # stat снят при планировании: всё, что дописано позже, попадёт в следующий запуск
+        key = os.path.abspath(file_path)
+        previous = self.entries.get(key, {})
+        with self._lock:
+            self.entries[key] = {
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "offset": offset,
+                "content_hash": self.content_hash(file_path, offset),
+                "lines": (previous.get("lines", 0) if append else 0) + lines,
+                "output": self._output_path(file_path)
+            }
@@ -16,6 +16,30 @@ DEFAULT_LOG_ANALYSIS_PROMPT = """Проанализируй следующие 
 {similar_logs}
 """
 
+# Map-reduce анализ: сначала каждый фрагмент логов разбирается отдельно,
+# затем частичные результаты сводятся в общий отчёт
+DEFAULT_MAP_PROMPT = """Это фрагмент логов. Кратко перечисли найденные ошибки, предупреждения и аномалии с указанием времени, компонентов и числа повторений. Если проблем нет, ответь "Проблем не обнаружено".
+
+Логи:
+{current_logs}
+"""
+
+DEFAULT_REDUCE_PROMPT = """Ниже приведены результаты анализа отдельных фрагментов логов. Объедини их в общий отчёт, убрав повторы. Предоставь:
+1. Краткое описание проблемы
+2. Возможные причины
+3. Рекомендации по исправлению
+
+Результаты анализа фрагментов:
+{partial_results}
+
+Похожие логи:
+{similar_logs}
+"""
+
+# Заголовки подготовленных логов: объясняют модели, как читать сводку шаблонов и отобранные окна
+TEMPLATE_SUMMARY_HEADER = "Логи сжаты до шаблонов строк в виде «число повторений × шаблон»; <*>, <NUM>, <IP>, <HEX> и <UUID> — переменные части, под шаблоном приведён пример исходной строки."
+FILTERED_WINDOWS_HEADER = "Наиболее важные фрагменты логов (отобраны по уровню, исключениям, редким шаблонам и всплескам частоты), в порядке следования; пропуски отмечены «...»."
+
 user_prompt_raw = os.getenv('LLM_PROMPT', '')
 
 if user_prompt_raw:
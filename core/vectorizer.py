@@ -1,20 +1,80 @@
 import os
 import json
+import threading
 import numpy as np
 import torch
 import faiss
 from transformers import AutoTokenizer, AutoModel
-from core.constants import logger
+from core.constants import logger, get_env_int, get_env_bool
+from core.embedding_cache import EmbeddingCache, DEFAULT_EMBED_CACHE_SIZE
+
+# Индексы крупнее этого порога открываются через mmap, а не читаются в память целиком
+DEFAULT_INDEX_MMAP_MB = 256
+
+# Типы индекса: flat — точный перебор, ivf/ivfpq/hnsw — приближённый поиск
+INDEX_TYPES = {'flat', 'ivf', 'ivfpq', 'hnsw'}
+DEFAULT_INDEX_TYPE = 'flat'
+# Пока записей меньше этого числа, используется flat: перебор и так быстрый,
+# а кластеризации IVF/PQ не на чем обучаться
+DEFAULT_MIN_TRAIN_VECTORS = 1000
+DEFAULT_IVF_NPROBE = 16
+# IVF переобучается, когда подходящее для текущего размера базы число кластеров
+# выросло во столько раз (при nlist ~ sqrt(N) — примерно вчетверо больше векторов)
+IVF_RETRAIN_GROWTH = 2
+# Векторы восстанавливаются из индекса блоками, чтобы не держать копию всей базы
+RECONSTRUCT_BLOCK = 65536
+DEFAULT_HNSW_M = 32
+DEFAULT_HNSW_EF_SEARCH = 64
+DEFAULT_HNSW_EF_CONSTRUCTION = 80
+DEFAULT_PQ_M = 48
+
+# Пакетная векторизация: бюджет токенов на один прогон модели и предел размера пакета
+MAX_SEQUENCE_TOKENS = 512
+DEFAULT_BATCH_TOKENS = 16384
+DEFAULT_MAX_BATCH_SIZE = 64
+
+# Векторизация всего корпуса логов скользящим окном: ~512 токенов на окно,
+# число окон ограничено, чтобы время построения запроса не росло с объёмом логов
+DEFAULT_WINDOW_CHARS = 1500
+DEFAULT_WINDOW_OVERLAP_CHARS = 200
+DEFAULT_MAX_WINDOWS = 256
+QUERY_POOLING_MODES = {'mean', 'multi'}
+
+MODEL_NAME = "microsoft/MiniLM-L12-H384-uncased"
 
 class Vectorizer:
     def __init__(self):
         logger.debug("Инициализация Vectorizer")
-        self.tokenizer = AutoTokenizer.from_pretrained("microsoft/MiniLM-L12-H384-uncased")
-        self.model = AutoModel.from_pretrained("microsoft/MiniLM-L12-H384-uncased")
+        self.tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+        self.model = AutoModel.from_pretrained(MODEL_NAME)
         self.dimension = 384
         self.index = None
+        self.index_mmapped = False
         self.metadata = []
         self.db_path = "./vector_db"
+        # Индекс меняется из потока интерфейса (add_many) и из фоновой миграции
+        self._lock = threading.RLock()
+        self._migration = None
+        self._generation = 0
+        self.embedding_cache = None
+        if get_env_bool('VECTOR_EMBED_CACHE', True):
+            try:
+                self.embedding_cache = EmbeddingCache(
+                    os.path.join(self.db_path, "embedding_cache"),
+                    self.dimension,
+                    f"{MODEL_NAME}:{MAX_SEQUENCE_TOKENS}",
+                    capacity=get_env_int('VECTOR_EMBED_CACHE_SIZE', DEFAULT_EMBED_CACHE_SIZE)
+                )
+            except Exception as e:
+                logger.error(f"Не удалось открыть кэш эмбеддингов, работа без кэша: {e}", exc_info=True)
+        self.batch_tokens = get_env_int('VECTOR_BATCH_TOKENS', DEFAULT_BATCH_TOKENS)
+        self.max_batch_size = get_env_int('VECTOR_MAX_BATCH_SIZE', DEFAULT_MAX_BATCH_SIZE)
+        self.window_chars = get_env_int('VECTOR_WINDOW_CHARS', DEFAULT_WINDOW_CHARS)
+        self.window_overlap = get_env_int('VECTOR_WINDOW_OVERLAP_CHARS', DEFAULT_WINDOW_OVERLAP_CHARS)
+        self.max_windows = get_env_int('VECTOR_MAX_WINDOWS', DEFAULT_MAX_WINDOWS)
+        pooling = os.getenv('VECTOR_QUERY_POOLING', 'multi').strip().lower()
+        self.query_pooling = pooling if pooling in QUERY_POOLING_MODES else 'multi'
+        self._load_index_settings()
         self._init_db()
         logger.debug("Vectorizer инициализирован")
     
@@ -23,41 +83,394 @@ class Vectorizer:
             logger.debug("Инициализация базы данных")
             os.makedirs(self.db_path, exist_ok=True)
             
-            self.index = faiss.IndexFlatL2(self.dimension)
-            
             metadata_path = os.path.join(self.db_path, "metadata.json")
             if os.path.exists(metadata_path):
                 with open(metadata_path, 'r', encoding='utf-8') as f:
                     self.metadata = json.load(f)
             
-            logger.debug(f"База данных инициализирована. Количество записей: {len(self.metadata)}")
+            self.index = self._load_index()
+            self._check_consistency()
+            self._sync_stored_vectors()
+            self._apply_index_type()
+            self.set_search_params()
+            
+            logger.debug(f"База данных инициализирована. Количество записей: {len(self.metadata)}, векторов в индексе: {self.index.ntotal}")
         except Exception as e:
             logger.error(f"Ошибка при инициализации базы данных: {e}", exc_info=True)
             raise
     
-    def get_embeddings(self, text):
-        inputs = self.tokenizer(text, return_tensors="pt", padding=True, truncation=True, max_length=512)
+    def _load_index_settings(self):
+        index_type = os.getenv('VECTOR_INDEX_TYPE', DEFAULT_INDEX_TYPE).strip().lower()
+        if index_type not in INDEX_TYPES:
+            logger.warning(f"Неизвестный тип индекса {index_type}, используется {DEFAULT_INDEX_TYPE}")
+            index_type = DEFAULT_INDEX_TYPE
+        self.index_type = index_type
+        self.min_train_vectors = get_env_int('VECTOR_INDEX_MIN_TRAIN', DEFAULT_MIN_TRAIN_VECTORS)
+        # 0 — число кластеров подбирается по размеру базы (~4·sqrt(N))
+        self.ivf_nlist = get_env_int('VECTOR_IVF_NLIST', 0)
+        self.ivf_nprobe = get_env_int('VECTOR_IVF_NPROBE', DEFAULT_IVF_NPROBE)
+        self.hnsw_m = get_env_int('VECTOR_HNSW_M', DEFAULT_HNSW_M)
+        self.hnsw_ef_search = get_env_int('VECTOR_HNSW_EF_SEARCH', DEFAULT_HNSW_EF_SEARCH)
+        self.pq_m = get_env_int('VECTOR_PQ_M', DEFAULT_PQ_M)
+    
+    @staticmethod
+    def index_kind(index):
+        if isinstance(index, faiss.IndexHNSW):
+            return 'hnsw'
+        if isinstance(index, faiss.IndexIVFPQ):
+            return 'ivfpq'
+        if isinstance(index, faiss.IndexIVF):
+            return 'ivf'
+        return 'flat'
+    
+    def _min_vectors_for(self, index_type):
+        if index_type == 'ivfpq':
+            # Кодбуки PQ по 256 центроидов требуют ~39·256 обучающих векторов
+            return max(self.min_train_vectors, 39 * 256)
+        if index_type == 'ivf':
+            return self.min_train_vectors
+        return 0
+    
+    def _create_index(self, vectors):
+        index_type = self.index_type
+        count = len(vectors)
+        if count < self._min_vectors_for(index_type):
+            logger.debug(f"Недостаточно векторов для обучения {index_type} ({count}), используется flat")
+            index_type = 'flat'
         
-        with torch.no_grad():
-            outputs = self.model(**inputs)
-            embeddings = outputs.last_hidden_state.mean(dim=1)
+        if index_type == 'hnsw':
+            index = faiss.IndexHNSWFlat(self.dimension, self.hnsw_m)
+            index.hnsw.efConstruction = DEFAULT_HNSW_EF_CONSTRUCTION
+        elif index_type in {'ivf', 'ivfpq'}:
+            nlist = self._ivf_nlist(count)
+            quantizer = faiss.IndexFlatL2(self.dimension)
+            if index_type == 'ivfpq':
+                if self.dimension % self.pq_m:
+                    raise ValueError(f"VECTOR_PQ_M={self.pq_m} должен делить размерность {self.dimension}")
+                index = faiss.IndexIVFPQ(quantizer, self.dimension, nlist, self.pq_m, 8)
+            else:
+                index = faiss.IndexIVFFlat(quantizer, self.dimension, nlist)
+            logger.debug(f"Обучение индекса {index_type} (nlist={nlist}) на {count} векторах")
+            index.train(vectors)
+        else:
+            index = faiss.IndexFlatL2(self.dimension)
         
-        return embeddings[0].numpy().astype(np.float64)
+        if count:
+            index.add(vectors)
+        return index
     
-    def add_to_db(self, text):
+    def _ivf_nlist(self, count):
+        nlist = self.ivf_nlist or int(4 * np.sqrt(count))
+        # FAISS рекомендует не меньше ~39 обучающих векторов на кластер
+        return max(1, min(nlist, count // 39))
+    
+    def _ivf_outgrown(self):
+        # Индекс обучен на небольшой базе: с её ростом списки удлиняются, и поиск
+        # с тем же nprobe просматривает всё большую долю векторов
+        if self.index_kind(self.index) not in {'ivf', 'ivfpq'}:
+            return False
+        return self._ivf_nlist(self.index.ntotal) >= IVF_RETRAIN_GROWTH * self.index.nlist
+    
+    def set_search_params(self, nprobe=None, ef_search=None):
+        # Компромисс точность/скорость: больше nprobe/efSearch — выше полнота, медленнее поиск
+        if nprobe is not None:
+            self.ivf_nprobe = nprobe
+        if ef_search is not None:
+            self.hnsw_ef_search = ef_search
+        kind = self.index_kind(self.index)
+        if kind in {'ivf', 'ivfpq'}:
+            self.index.nprobe = max(1, min(self.ivf_nprobe, self.index.nlist))
+        elif kind == 'hnsw':
+            self.index.hnsw.efSearch = max(1, self.hnsw_ef_search)
+    
+    def _reconstruct_vectors(self, count, start=0):
+        if count <= start:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        self._ensure_writable()
+        ivf = faiss.try_extract_index_ivf(self.index)
+        if ivf is not None:
+            ivf.make_direct_map()
+        return np.ascontiguousarray(self.index.reconstruct_n(start, count - start), dtype=np.float32)
+    
+    def _vectors_path(self):
+        return os.path.join(self.db_path, "vectors.f32")
+    
+    def _stored_vectors(self, count):
+        # Исходные векторы записей без потерь: переобучение не восстанавливает их
+        # из сжатого индекса и не прогоняет тексты через модель заново
+        if not count:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        vectors = np.fromfile(self._vectors_path(), dtype=np.float32, count=count * self.dimension)
+        return vectors.reshape(count, self.dimension)
+    
+    def _write_vectors(self, vectors, append=True):
+        with open(self._vectors_path(), 'ab' if append else 'wb') as f:
+            np.ascontiguousarray(vectors, dtype=np.float32).tofile(f)
+    
+    def _sync_stored_vectors(self):
+        # Файл векторов дописывается после индекса и до метаданных: при сбое
+        # лишний хвост отрезается, а недостающие векторы (база старой версии)
+        # берутся из индекса без потерь или считаются заново
+        path = self._vectors_path()
+        row_bytes = self.dimension * 4
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        stored = size // row_bytes
+        expected = len(self.metadata)
+        if stored > expected or size % row_bytes:
+            stored = min(stored, expected)
+            os.truncate(path, stored * row_bytes)
+        if stored == expected:
+            return
+        logger.debug(f"Файл векторов: {stored} из {expected}, дополнение")
+        if self.index_kind(self.index) != 'ivfpq' and self.index.ntotal == expected:
+            for start in range(stored, expected, RECONSTRUCT_BLOCK):
+                self._write_vectors(self._reconstruct_vectors(min(expected, start + RECONSTRUCT_BLOCK), start))
+        else:
+            self._write_vectors(self.get_embeddings_batch(self.metadata[stored:]))
+    
+    def _migration_needed(self):
+        current = self.index_kind(self.index)
+        if current == self.index_type:
+            return self._ivf_outgrown()
+        return self.index.ntotal >= self._min_vectors_for(self.index_type)
+    
+    def _apply_index_type(self):
+        if self._migration_needed():
+            self.migrate_index()
+    
+    def _set_index(self, index):
+        self.index = index
+        self.index_mmapped = False
+        self.set_search_params()
+        self._save_index()
+    
+    def migrate_index(self):
+        with self._lock:
+            logger.debug(f"Миграция индекса {self.index_kind(self.index)} -> {self.index_type}, "
+                         f"векторов: {self.index.ntotal}")
+            self._set_index(self._create_index(self._stored_vectors(self.index.ntotal)))
+    
+    def _start_background_migration(self):
+        # Обучение индекса на всей базе занимает от секунд до минут, а add_many
+        # вызывается из потока интерфейса: новый индекс строится в фоне
+        if self._migration is not None and self._migration.is_alive():
+            return
+        self._migration = threading.Thread(target=self._migrate_in_background, daemon=True)
+        self._migration.start()
+    
+    def _migrate_in_background(self):
         try:
-            embeddings = self.get_embeddings(text)
-            
-            self.index.add(np.array([embeddings], dtype=np.float64))
+            with self._lock:
+                count = self.index.ntotal
+                generation = self._generation
+                logger.debug(f"Фоновая миграция индекса {self.index_kind(self.index)} -> {self.index_type}, "
+                             f"векторов: {count}")
+            index = self._create_index(self._stored_vectors(count))
+            with self._lock:
+                if generation != self._generation:
+                    logger.debug("База изменилась во время миграции, результат отброшен")
+                    return
+                # Записи, добавленные за время обучения
+                if self.index.ntotal > count:
+                    index.add(self._stored_vectors(self.index.ntotal)[count:])
+                self._set_index(index)
+        except Exception as e:
+            logger.error(f"Ошибка фоновой миграции индекса: {e}", exc_info=True)
+    
+    def wait_for_migration(self, timeout=None):
+        if self._migration is not None:
+            self._migration.join(timeout)
+    
+    def _load_index(self, mmap=None):
+        index_path = os.path.join(self.db_path, "faiss.index")
+        self.index_mmapped = False
+        if not os.path.exists(index_path):
+            return faiss.IndexFlatL2(self.dimension)
+        try:
+            if mmap is None:
+                threshold = get_env_int('VECTOR_DB_MMAP_MB', DEFAULT_INDEX_MMAP_MB) * 1024 * 1024
+                mmap = os.path.getsize(index_path) > threshold
+            if mmap:
+                index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+                self.index_mmapped = True
+            else:
+                index = faiss.read_index(index_path)
+            logger.debug(f"Загружен индекс {index_path}: {index.ntotal} векторов, mmap: {self.index_mmapped}")
+            return index
+        except Exception as e:
+            logger.error(f"Не удалось прочитать индекс {index_path}, он будет перестроен: {e}", exc_info=True)
+            return faiss.IndexFlatL2(self.dimension)
+    
+    def _check_consistency(self):
+        # Индекс и metadata.json пишутся разными файлами, поэтому после сбоя
+        # они могут разойтись; восстанавливаем соответствие по metadata
+        if self.index.d != self.dimension:
+            logger.warning(f"Размерность индекса {self.index.d} не совпадает с {self.dimension}, полная перестройка")
+            self.rebuild_index()
+            return
+        
+        total = self.index.ntotal
+        expected = len(self.metadata)
+        if total == expected:
+            return
+        
+        logger.warning(f"Индекс не согласован с метаданными: {total} векторов, {expected} записей")
+        if total > expected:
+            # Лишние векторы в хвосте — записи, для которых не успели сохранить метаданные
+            self._ensure_writable()
+            if self.index_kind(self.index) == 'hnsw':
+                # HNSW не поддерживает удаление, но хранит векторы без потерь
+                self.index = self._create_index(self._reconstruct_vectors(expected))
+                self.set_search_params()
+            else:
+                self.index.remove_ids(faiss.IDSelectorRange(expected, total))
+        else:
+            # Досчитываем эмбеддинги только для недостающих записей
+            self._ensure_writable()
+            self.index.add(self.get_embeddings_batch(self.metadata[total:]))
+        self._save_index()
+    
+    def _ensure_writable(self):
+        # Индекс, открытый через mmap, доступен только для чтения
+        if self.index_mmapped:
+            self.index = self._load_index(mmap=False)
+    
+    def _save_index(self):
+        index_path = os.path.join(self.db_path, "faiss.index")
+        tmp_path = index_path + ".tmp"
+        faiss.write_index(self.index, tmp_path)
+        os.replace(tmp_path, index_path)
+    
+    def _save_metadata(self):
+        metadata_path = os.path.join(self.db_path, "metadata.json")
+        tmp_path = metadata_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.metadata, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, metadata_path)
+    
+    def rebuild_index(self):
+        with self._lock:
+            logger.debug(f"Перестройка индекса по {len(self.metadata)} записям")
+            vectors = self.get_embeddings_batch(self.metadata)
+            self._generation += 1
+            self._write_vectors(vectors, append=False)
+            self._set_index(self._create_index(vectors))
+    
+    def get_embeddings(self, text):
+        return self.get_embeddings_batch([text])[0].astype(np.float64)
+    
+    def get_embeddings_batch(self, texts, batch_tokens=None):
+        texts = list(texts)
+        result = np.empty((len(texts), self.dimension), dtype=np.float32)
+        if not texts:
+            return result
+        
+        if self.embedding_cache is None:
+            return self._compute_embeddings(texts, result, batch_tokens)
+        
+        # Через модель прогоняются только тексты, которых ещё нет в кэше
+        keys = [self.embedding_cache.key(text) for text in texts]
+        cached = self.embedding_cache.get_many(keys)
+        missing = {}
+        for i, key in enumerate(keys):
+            if key in cached:
+                result[i] = cached[key]
+            else:
+                missing.setdefault(key, []).append(i)
+        logger.debug(f"Эмбеддинги: {len(texts) - sum(map(len, missing.values()))} из кэша, {len(missing)} к вычислению")
+        
+        if missing:
+            missing_keys = list(missing)
+            computed = self._compute_embeddings(
+                [texts[missing[key][0]] for key in missing_keys],
+                np.empty((len(missing_keys), self.dimension), dtype=np.float32),
+                batch_tokens
+            )
+            for key, vector in zip(missing_keys, computed):
+                result[missing[key]] = vector
+            self.embedding_cache.put_many(missing_keys, computed)
+        return result
+    
+    def _compute_embeddings(self, texts, result, batch_tokens=None):
+        budget = batch_tokens or self.batch_tokens
+        input_ids = self.tokenizer(texts, truncation=True, max_length=MAX_SEQUENCE_TOKENS)['input_ids']
+        
+        # Сортировка по длине: в пакет попадают тексты близкой длины, и паддинг
+        # почти не тратит вычислений. Размер пакета подбирается так, чтобы
+        # (число текстов × самая длинная последовательность) укладывалось в бюджет
+        order = sorted(range(len(texts)), key=lambda i: len(input_ids[i]), reverse=True)
+        start = 0
+        while start < len(order):
+            longest = max(1, len(input_ids[order[start]]))
+            size = max(1, min(self.max_batch_size, budget // longest))
+            batch_ids = order[start:start + size]
+            inputs = self.tokenizer.pad({'input_ids': [input_ids[i] for i in batch_ids]}, return_tensors="pt")
             
-            self.metadata.append(text)
+            with torch.no_grad():
+                hidden = self.model(**inputs).last_hidden_state
+                # Усреднение только по реальным токенам, без паддинга
+                mask = inputs['attention_mask'].unsqueeze(-1).to(hidden.dtype)
+                pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
             
-            metadata_path = os.path.join(self.db_path, "metadata.json")
-            with open(metadata_path, 'w', encoding='utf-8') as f:
-                json.dump(self.metadata, f, ensure_ascii=False, indent=2)
+            result[batch_ids] = pooled.numpy()
+            start += size
+        
+        return result
+    
+    def embed_corpus(self, chunks, total_chars=None):
+        """Эмбеддинги окон по всему корпусу.
+
+        chunks — последовательность текстовых порций длиной около window_chars
+        (например, LogBuffer.iter_chunks). Если окон больше max_windows, они
+        берутся равномерно по всему корпусу, а не только из начала.
+        """
+        step = 1
+        if total_chars:
+            estimated = total_chars // max(1, self.window_chars) + 1
+            step = max(1, -(-estimated // max(1, self.max_windows)))
+        
+        windows = []
+        previous = ""
+        for i, chunk in enumerate(chunks):
+            if i % step:
+                previous = ""
+                continue
+            # Соседние окна перекрываются, чтобы события на границе не терялись
+            overlap = previous[-self.window_overlap:] if self.window_overlap > 0 else ""
+            windows.append(overlap + "\n" + chunk if overlap else chunk)
+            previous = chunk
+            if len(windows) >= self.max_windows:
+                break
+        
+        logger.debug(f"Векторизация корпуса: {len(windows)} окон, шаг выборки {step}")
+        return self.get_embeddings_batch(windows)
+    
+    def add_to_db(self, text):
+        return self.add_many([text])
+    
+    def add_many(self, texts):
+        try:
+            texts = list(texts)
+            if not texts:
+                return True
+            embeddings = self.get_embeddings_batch(texts)
             
-            index_path = os.path.join(self.db_path, "faiss.index")
-            faiss.write_index(self.index, index_path)
+            with self._lock:
+                self._ensure_writable()
+                self.index.add(embeddings)
+                
+                self.metadata.extend(texts)
+                
+                # Сначала индекс и векторы, затем метаданные: при сбое между записями
+                # лишний вектор будет отброшен при следующем запуске
+                self._save_index()
+                self._write_vectors(embeddings)
+                self._save_metadata()
+                
+                # Накопилось достаточно записей для обучения выбранного типа индекса
+                # или для переобучения IVF с большим числом кластеров
+                if self._migration_needed():
+                    self._start_background_migration()
             
             return True
         except Exception as e:
@@ -66,11 +479,11 @@ class Vectorizer:
     
     def search(self, query_embeddings, k=5):
         try:
-            distances, indices = self.index.search(np.array([query_embeddings], dtype=np.float64), k)
+            distances, indices = self.index.search(np.array([query_embeddings], dtype=np.float32), k)
             
             results = []
             for idx in indices[0]:
-                if idx < len(self.metadata):
+                if 0 <= idx < len(self.metadata):
                     results.append(self.metadata[idx])
             
             return "\n".join(results)
@@ -78,18 +491,38 @@ class Vectorizer:
             logger.error(f"Ошибка при поиске: {e}")
             return ""
     
-    def clear_db(self):
+    def search_many(self, query_vectors, k=5, pooling=None):
         try:
-            self.index = faiss.IndexFlatL2(self.dimension)
+            pooling = pooling or self.query_pooling
+            query_vectors = np.ascontiguousarray(query_vectors, dtype=np.float32)
+            if not len(query_vectors):
+                return ""
+            if pooling == 'mean' or len(query_vectors) == 1:
+                return self.search(query_vectors.mean(axis=0), k)
             
-            self.metadata = []
+            # Мультивекторный поиск: каждое окно ищет соседей отдельно,
+            # результаты объединяются по сумме обратных рангов
+            distances, indices = self.index.search(query_vectors, k)
+            scores = {}
+            for row in indices:
+                for rank, idx in enumerate(row):
+                    if 0 <= idx < len(self.metadata):
+                        scores[idx] = scores.get(idx, 0.0) + 1.0 / (rank + 1)
             
-            metadata_path = os.path.join(self.db_path, "metadata.json")
-            with open(metadata_path, 'w', encoding='utf-8') as f:
-                json.dump(self.metadata, f, ensure_ascii=False, indent=2)
-            
-            index_path = os.path.join(self.db_path, "faiss.index")
-            faiss.write_index(self.index, index_path)
+            best = sorted(scores, key=scores.get, reverse=True)[:k]
+            return "\n".join(self.metadata[idx] for idx in best)
+        except Exception as e:
+            logger.error(f"Ошибка при поиске: {e}")
+            return ""
+    
+    def clear_db(self):
+        try:
+            with self._lock:
+                self._generation += 1
+                self._set_index(self._create_index(np.empty((0, self.dimension), dtype=np.float32)))
+                self._write_vectors(np.empty((0, self.dimension), dtype=np.float32), append=False)
+                self.metadata = []
+                self._save_metadata()
             
             return True
         except Exception as e:
@@ -100,6 +533,9 @@ class Vectorizer:
         try:
             return {
                 "total_records": len(self.metadata),
+                "index_records": self.index.ntotal,
+                "index_type": self.index_kind(self.index),
+                "index_mmapped": self.index_mmapped,
                 "dimension": self.dimension,
                 "directory": self.db_path
             }
@@ -0,0 +1,47 @@
+import io
+from core.csv_reader import CsvReader, parse_timestamps, normalize_level
+from core.log_filter import SEVERITY_PATTERN, line_minute
+
+
+def read(text, block_rows=2):
+    return list(CsvReader(io.StringIO(text, newline='')).iter_records(block_rows))
+
+
+def test_quoted_fields():
+    records = read('id;when;sev;msg\n'
+                   '1;2024-01-01 10:00:00;INFO;"hello; world"\n'
+                   '2;2024-01-01 10:00:05;ERROR;"multi\nline"\n')
+    assert records == [
+        'when: 2024-01-01T10:00:00 | sev: INFO | msg: hello; world | id: 1',
+        'when: 2024-01-01T10:00:05 | sev: ERROR | msg: multi\nline | id: 2',
+    ]
+
+
+def test_typed_time_and_level():
+    # Unix-время и числовой уровень syslog приводятся к виду, который понимает фильтр
+    records = read('ts,severity,host,message\n'
+                   '1704110400,3,web1,disk full\n'
+                   '1704110460123,warn,web2,slow request\n'
+                   '2024-01-01T15:02:00+03:00,custom,web3,moved\n'
+                   'n/a,Info,web4,started\n')
+    assert records == [
+        'ts: 2024-01-01T12:00:00Z | severity: ERROR | message: disk full | host: web1',
+        'ts: 2024-01-01T12:01:00Z | severity: WARNING | message: slow request | host: web2',
+        'ts: 2024-01-01T12:02:00Z | severity: custom | message: moved | host: web3',
+        'ts: n/a | severity: INFO | message: started | host: web4',
+    ]
+    assert [line_minute(record) for record in records] == [
+        '2024-01-01T12:00', '2024-01-01T12:01', '2024-01-01T12:02', None
+    ]
+    assert [bool(SEVERITY_PATTERN.search(record.lower())) for record in records] == [True, True, False, False]
+
+
+def test_parse_timestamps():
+    times, utc = parse_timestamps(['2024-01-01 10:00', '2024-02-30 10:00', '2024-01-01T10:00:00.5Z', ''])
+    assert [str(time) for time in times] == ['2024-01-01T10:00:00', 'NaT', '2024-01-01T10:00:00', 'NaT']
+    assert utc.tolist() == [False, False, True, False]
+
+
+def test_normalize_level():
+    assert [normalize_level(value) for value in ('err', ' Warning ', '0', 'verbose')] == \
+        ['ERROR', 'WARNING', 'EMERGENCY', 'verbose']
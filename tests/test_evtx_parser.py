@@ -0,0 +1,59 @@
+import io
+import os
+from core.evtx_parser import (iter_evtx_records, format_event, is_evtx, local_name,
+                              FILE_HEADER_SIZE, CHUNK_SIZE)
+
+# Журнал из одного чанка с тремя событиями; значения ниже сверены
+# с выводом python-evtx для того же файла
+SAMPLE_PATH = os.path.join(os.path.dirname(__file__), "data", "sample.evtx")
+
+
+def read_records(start=0, end=None):
+    with open(SAMPLE_PATH, 'rb') as f:
+        return list(iter_evtx_records(f, start, end))
+
+
+def find(event, name):
+    return event.find(f".//{name}")
+
+
+def test_is_evtx():
+    with open(SAMPLE_PATH, 'rb') as f:
+        assert is_evtx(f)
+    assert not is_evtx(io.BytesIO(b"not an event log"))
+
+
+def test_records():
+    records = read_records()
+    assert [record_id for record_id, _, _ in records] == [1, 2, 3]
+    for index, (_, filetime, event) in enumerate(records):
+        assert local_name(event.tag) == 'Event'
+        assert event.get('xmlns') == 'http://schemas.microsoft.com/win/2004/08/events/event'
+        assert find(event, 'EventID').text == str(7000 + index)
+        assert find(event, 'Provider').get('Name') == 'Service Control Manager'
+        assert find(event, 'TimeCreated').get('SystemTime') == f"2024-01-01 12:00:0{index}"
+        assert find(event, 'Computer').text == f"HOST-{index}"
+        assert find(event, 'Security').get('UserID') == 'S-1-5-18'
+        assert filetime == 133485840000000000 + index * 10 ** 7
+
+
+def test_event_data():
+    # EventData приходит вложенным двоичным XML через подстановку шаблона
+    _, _, event = read_records()[1]
+    data = event.findall("./EventData/Data")
+    assert [(item.get('Name'), item.text) for item in data] == [
+        ('User', 'user1'), ('Count', '10'), (None, 'a&amp;b')
+    ]
+
+
+def test_format_event():
+    assert format_event(*read_records()[0]) == (
+        "EventID: 7000 | Time: 2024-01-01 12:00:00 | Source: Service Control Manager | Type: 2 | "
+        "Category: 0 | Computer: HOST-0 | Record: 1 | Message: User=user0 | Count=0 | a&amp;b"
+    )
+
+
+def test_chunk_ranges():
+    # Диапазон задаётся границами чанков: первый чанк целиком и пустой хвост
+    assert len(read_records(0, FILE_HEADER_SIZE + CHUNK_SIZE)) == 3
+    assert read_records(FILE_HEADER_SIZE + CHUNK_SIZE) == []
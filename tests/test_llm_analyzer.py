@@ -0,0 +1,52 @@
+from core.llm_analyzer import LLMAnalyzer
+from core.log_buffer import LogBuffer
+from core.prompts import DEFAULT_MAP_PROMPT, DEFAULT_REDUCE_PROMPT
+
+
+class FakeAnalyzer(LLMAnalyzer):
+    # Ответ «модели» задаёт тест; запросы запоминаются для проверки
+    def __init__(self, logs, answer):
+        super().__init__("http://localhost", "", logs, None)
+        self.answer = answer
+        self.prompts = []
+
+    def _request_completion(self, prompt, stream=False, key_prompt=None, final=False):
+        self.prompts.append(prompt)
+        return self.answer(prompt)
+
+
+def make_logs(lines):
+    logs = LogBuffer()
+    logs.append([f"2024-01-01 10:00:00 worker-{i % 7} processed request {i} in {i % 50} ms" for i in range(lines)])
+    return logs
+
+
+def map_prompts(analyzer):
+    head = DEFAULT_MAP_PROMPT.split("{current_logs}")[0]
+    return [prompt for prompt in analyzer.prompts if prompt.startswith(head)]
+
+
+def test_map_chunks_capped_on_real_count(monkeypatch):
+    monkeypatch.setenv('LLM_CHUNK_TOKENS', '250')
+    monkeypatch.setenv('LLM_MAX_MAP_CHUNKS', '10')
+    analyzer = FakeAnalyzer(make_logs(5000), lambda prompt: "ok")
+    analyzer._map_reduce("")
+
+    # Фрагментов больше оценки по объёму: шаг по оценке дал бы 12 запросов
+    assert sum(1 for _ in analyzer.logs.iter_content_chunks(1000)) > analyzer.logs.char_count // 1000 + 1
+    assert len(map_prompts(analyzer)) == 10
+
+
+def test_reduce_prompts_stay_within_chunk_budget(monkeypatch):
+    # Каждый частичный результат длиннее половины бюджета: без попарной свёртки
+    # итоговый запрос склеил бы их все
+    monkeypatch.setenv('LLM_CHUNK_TOKENS', '250')
+    monkeypatch.setenv('LLM_MAX_MAP_CHUNKS', '0')
+    analyzer = FakeAnalyzer(make_logs(300), lambda prompt: "x" * 900)
+    analyzer._map_reduce("similar")
+
+    reduce_overhead = len(DEFAULT_REDUCE_PROMPT.format(partial_results="", similar_logs="similar"))
+    reduces = analyzer.prompts[len(map_prompts(analyzer)):]
+    assert len(map_prompts(analyzer)) > 8
+    assert reduces and max(map(len, reduces)) <= 1000 + 2 + reduce_overhead
+    assert reduces[-1].rstrip().endswith("similar")
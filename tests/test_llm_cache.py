@@ -0,0 +1,37 @@
+import os
+import json
+import time
+from core.llm_cache import ResponseCache
+
+
+def test_expiry_counts_from_creation(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_age=100)
+    key = ResponseCache.make_key(prompt="a")
+    cache.put(key, "answer")
+    path = cache._path(key)
+
+    # Попадание не продлевает срок: время изменения остаётся временем записи
+    mtime = os.stat(path).st_mtime
+    assert cache.get(key) == "answer"
+    assert os.stat(path).st_mtime == mtime
+
+    with open(path, 'r', encoding='utf-8') as f:
+        entry = json.load(f)
+    entry["created"] -= 200
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(entry, f)
+    assert cache.get(key) is None
+    assert not os.path.exists(path)
+
+
+def test_eviction_keeps_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=10 ** 6)
+    keys = [ResponseCache.make_key(prompt=str(i)) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, "x" * 1000)
+        os.utime(cache._path(key), (time.time() - 100 + i, time.time() - 100 + i))
+    # Самая старая запись только что использована: вытесняется следующая по давности
+    assert cache.get(keys[0]) is not None
+    cache.max_bytes = 2500
+    cache.put(ResponseCache.make_key(prompt="3"), "x")
+    assert [os.path.exists(cache._path(key)) for key in keys] == [True, False, True]
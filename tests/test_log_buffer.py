@@ -0,0 +1,17 @@
+from core.log_buffer import LogBuffer
+
+
+def test_spilled_records_keep_newlines():
+    # Записи CSV и YAML содержат переводы строк: после сброса на диск
+    # они читаются теми же записями, а не отдельными строками
+    records = [f"id: {i} | msg: line one\nline two\r\n" if i % 3 == 0 else f"plain {i}" for i in range(1000)]
+    buffer = LogBuffer(memory_limit=4096)
+    for start in range(0, len(records), 100):
+        buffer.append(records[start:start + 100])
+
+    assert buffer.spilled
+    assert list(buffer.iter_lines()) == records
+    assert buffer.line_count == len(records)
+    assert buffer.char_count == len("\n".join(records))
+    assert "\n".join(buffer.iter_chunks(500)) == "\n".join(records)
+    buffer.close()
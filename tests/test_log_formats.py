@@ -0,0 +1,65 @@
+import re
+import core.log_formats as log_formats
+from core.log_formats import LineFormat, PLAIN, SYSLOG, detect_format, iter_formatted_lines, register_format
+
+
+def formatted(lines, ext=''):
+    line_format, result = iter_formatted_lines(lines, ext)
+    return line_format.name, list(result)
+
+
+def test_detect_registered_formats():
+    access = '10.0.0.1 - - [10/Oct/2024:13:55:36 +0000] "GET /a HTTP/1.1" 500 12 "-" "curl/8"'
+    assert formatted([access] * 3) == ('access-log', [
+        'Level: ERROR | Time: 10/Oct/2024:13:55:36 +0000 | Client: 10.0.0.1 | Request: GET /a HTTP/1.1 | '
+        'Status: 500 | Size: 12 | Agent: curl/8'
+    ] * 3)
+    assert formatted(['time=2024-01-01T10:00:00Z level=error msg="disk full" host=a'] * 3) == ('logfmt', [
+        'time: 2024-01-01T10:00:00Z | level: error | msg: disk full | host: a'
+    ] * 3)
+    # Без LOG_JSON_FIELDS записи JSON Lines выдаются как есть
+    assert formatted(['{"level":"error","msg":"x"}'] * 3) == ('json', ['{"level":"error","msg":"x"}'] * 3)
+
+
+def test_mixed_syslog_variants():
+    # RFC 5424 и RFC 3164 в одном файле: каждая строка разбирается своим вариантом
+    assert formatted([
+        '<11>1 2024-01-01T12:00:10Z web1 nginx 12 - - upstream timed out',
+        'Jan  5 10:00:00 web2 sshd[42]: Failed password',
+    ]) == ('syslog', [
+        'Priority: 11 | Level: ERROR | Time: 2024-01-01T12:00:10Z | Host: web1 | Program: nginx[12] | '
+        'Message: upstream timed out',
+        'Time: Jan  5 10:00:00 | Host: web2 | Program: sshd[42] | Message: Failed password',
+    ])
+
+
+def test_stack_trace_joined_to_record():
+    assert formatted([
+        '2024-01-01 ERROR boom',
+        'java.lang.IllegalStateException: bad',
+        'at com.x.Y.z(Y.java:1)',
+        '2024-01-01 INFO next',
+    ]) == ('java-stacktrace', [
+        '2024-01-01 ERROR boom | java.lang.IllegalStateException: bad | at com.x.Y.z(Y.java:1)',
+        '2024-01-01 INFO next',
+    ])
+
+
+def test_extension_fallback():
+    # Содержимое не узнано: формат выбирается по расширению, иначе строки как есть
+    lines = ['free text line'] * 3
+    assert detect_format(lines, '.syslog') is SYSLOG
+    assert detect_format(lines, '.txt') is PLAIN
+    assert formatted(lines, '.txt') == ('plain', lines)
+
+
+def test_register_format(monkeypatch):
+    monkeypatch.setattr(log_formats, 'LINE_FORMATS', dict(log_formats.LINE_FORMATS))
+    custom = register_format(LineFormat(
+        'custom',
+        re.compile(r'(?P<level>[A-Z]+)\|(?P<message>.*)$'),
+        lambda match: f"Level: {match.group('level')} | Message: {match.group('message')}"
+    ))
+    assert detect_format(['ERROR|disk full', 'INFO|ok']) is custom
+    assert formatted(['ERROR|disk full', 'INFO|ok']) == ('custom', ['Level: ERROR | Message: disk full',
+                                                                    'Level: INFO | Message: ok'])
@@ -0,0 +1,92 @@
+import os
+from core.log_processor import LogProcessor, parse_options
+from core.manifest import FileManifest
+
+
+def run_processor(folder, incremental=True):
+    # Разбор в текущем потоке: run() вызывается напрямую, без запуска QThread
+    processor = LogProcessor(str(folder), incremental=incremental, num_processes=1)
+    results = []
+    processor.finished.connect(results.append)
+    processor.error.connect(lambda message: results.append(RuntimeError(message)))
+    processor.run()
+    assert results and not isinstance(results[0], Exception), results
+    return list(results[0].iter_lines())
+
+
+def test_cache_reset_on_parse_options_change(tmp_path, monkeypatch):
+    # Смена LOG_XML_RECORD_TAG меняет вывод парсера XML: кэш разбора не должен его скрывать
+    monkeypatch.setenv('LOG_PARSE_CACHE_DIR', str(tmp_path / "cache"))
+    monkeypatch.delenv('LOG_XML_RECORD_TAG', raising=False)
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    (logs / "a.xml").write_text('<log><event id="1"><msg>a</msg></event></log>', encoding='utf-8')
+
+    assert run_processor(logs) == ['event | @id: 1 | msg: a']
+    assert run_processor(logs) == ['event | @id: 1 | msg: a']
+    monkeypatch.setenv('LOG_XML_RECORD_TAG', 'msg')
+    assert run_processor(logs) == ['msg | msg: a']
+    assert run_processor(logs) == run_processor(logs, incremental=False)
+
+
+def test_parse_failure_not_cached(tmp_path, monkeypatch):
+    # Оборванный XML: первая запись выдаётся, но частичный разбор не кэшируется
+    monkeypatch.setenv('LOG_PARSE_CACHE_DIR', str(tmp_path / "cache"))
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    (logs / "a.xml").write_text('<log><event id="1"><msg>a</msg></event><event id="2">', encoding='utf-8')
+
+    assert run_processor(logs) == ['event | @id: 1 | msg: a']
+    assert FileManifest(str(tmp_path / "cache"), parse_options()).entries == {}
+
+
+def test_rewrite_with_same_size_and_mtime(tmp_path, monkeypatch):
+    # Правка за пределами первых 64 КБ без изменения размера и времени изменения
+    monkeypatch.setenv('LOG_PARSE_CACHE_DIR', str(tmp_path / "cache"))
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    path = logs / "app.log"
+    lines = [f"2024-01-01 10:00:00 INFO request {i:06d} done" for i in range(5000)]
+    path.write_text("\n".join(lines) + "\n", encoding='utf-8')
+    assert run_processor(logs)[-1].endswith("request 004999 done")
+
+    stat = path.stat()
+    lines[-1] = lines[-1].replace("INFO", "WARN")
+    path.write_text("\n".join(lines) + "\n", encoding='utf-8')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert path.stat().st_size == stat.st_size
+    assert run_processor(logs)[-1] == run_processor(logs, incremental=False)[-1]
+    assert "WARN" in run_processor(logs)[-1]
+
+
+def test_split_range_on_line_boundaries(tmp_path):
+    path = tmp_path / "app.log"
+    lines = [f"2024-01-01 10:00:00 INFO request {i} pad" + "x" * (i % 37) for i in range(20000)]
+    path.write_text("\n".join(lines) + "\n", encoding='utf-8')
+    processor = LogProcessor(str(tmp_path), incremental=False, num_processes=2)
+    processor.split_bytes = 64 * 1024
+    size = path.stat().st_size
+
+    ranges = processor._split_range(str(path), 0, size)
+    assert len(ranges) > 5
+    assert ranges[0][0] == 0 and ranges[-1][1] == size
+    data = path.read_bytes()
+    for (_, end), (next_start, _) in zip(ranges, ranges[1:]):
+        assert end == next_start and data[end - 1:end] == b"\n"
+    assert [line for start, end in ranges for line in LogProcessor.iter_file_range(str(path), start, end)] == lines
+
+
+def test_parallel_parts_keep_order(tmp_path, monkeypatch):
+    # Части большого файла разбираются разными процессами и склеиваются по порядку
+    monkeypatch.setenv('LOG_SPLIT_MB', '1')
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    lines = [f"2024-01-01 10:00:00 INFO request {i:06d} done in {i % 97} ms" for i in range(60000)]
+    (logs / "app.log").write_text("\n".join(lines) + "\n", encoding='utf-8')
+    processor = LogProcessor(str(logs), incremental=False, num_processes=2)
+    assert len(processor._split_range(str(logs / "app.log"), 0, (logs / "app.log").stat().st_size)) >= 2
+
+    results = []
+    processor.finished.connect(results.append)
+    processor.run()
+    assert list(results[0].iter_lines()) == lines
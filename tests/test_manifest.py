@@ -0,0 +1,81 @@
+import os
+from core.manifest import FileManifest, HASH_BLOCK_BYTES
+from tests.test_log_processor import run_processor
+
+
+def write(path, text, mode='w'):
+    with open(path, mode, encoding='utf-8', newline='') as f:
+        f.write(text)
+
+
+def commit(manifest, path, lines):
+    action, start, end, stat = manifest.plan(str(path), True)
+    output = manifest.open_output(str(path), action == 'append')
+    manifest.write_lines(output, lines)
+    output.close(ok=True)
+    manifest.commit(str(path), stat, end, len(lines), action == 'append')
+    return action, start, end
+
+
+def test_plan_reuse_append_full(tmp_path):
+    manifest = FileManifest(str(tmp_path / "cache"))
+    path = tmp_path / "app.log"
+    write(path, "a\nb\npartial")
+    # Незавершённая строка не входит в кэшируемую часть
+    assert commit(manifest, path, ["a", "b"]) == ('full', 0, 4)
+    assert manifest.plan(str(path), True)[:3] == ('reuse', 4, 4)
+
+    write(path, " line\nc\n", mode='a')
+    assert commit(manifest, path, ["partial line", "c"]) == ('append', 4, 19)
+    assert list(manifest.iter_cached(str(path), 1024)) == [["a", "b", "partial line", "c"]]
+
+    # Перезапись начала файла — разбор заново
+    write(path, "x\nb\npartial line\nc\nd\n")
+    assert manifest.plan(str(path), True)[:3] == ('full', 0, 21)
+
+
+def test_plan_detects_tail_change(tmp_path):
+    manifest = FileManifest(str(tmp_path / "cache"))
+    path = tmp_path / "app.log"
+    text = "x" * (3 * HASH_BLOCK_BYTES) + "\n"
+    write(path, text)
+    commit(manifest, path, [text[:-1]])
+
+    stat = os.stat(path)
+    write(path, text[:-2] + "y\n")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert manifest.plan(str(path), True)[0] == 'full'
+
+
+def test_failed_output_rolls_back(tmp_path):
+    manifest = FileManifest(str(tmp_path / "cache"))
+    path = tmp_path / "app.log"
+    write(path, "a\n")
+    commit(manifest, path, ["a"])
+
+    # Неуспешный полный разбор не заменяет прежний кэш
+    output = manifest.open_output(str(path), False)
+    manifest.write_lines(output, ["other"])
+    output.close(ok=False)
+    assert list(manifest.iter_cached(str(path), 1024)) == [["a"]]
+
+    # Неуспешное дописывание отрезается до прежнего размера
+    output = manifest.open_output(str(path), True)
+    manifest.write_lines(output, ["b", "c"])
+    output.close(ok=False)
+    assert list(manifest.iter_cached(str(path), 1024)) == [["a"]]
+
+
+def test_incremental_run_matches_full(tmp_path, monkeypatch):
+    monkeypatch.setenv('LOG_PARSE_CACHE_DIR', str(tmp_path / "cache"))
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    path = logs / "app.log"
+    write(path, "2024-01-01 10:00:00 INFO start\n2024-01-01 10:00:01 ERROR fa")
+    assert run_processor(logs) == ["2024-01-01 10:00:00 INFO start", "2024-01-01 10:00:01 ERROR fa"]
+
+    write(path, "iled\n2024-01-01 10:00:02 INFO done\n", mode='a')
+    expected = ["2024-01-01 10:00:00 INFO start", "2024-01-01 10:00:01 ERROR failed", "2024-01-01 10:00:02 INFO done"]
+    assert run_processor(logs) == expected
+    assert run_processor(logs) == expected
+    assert run_processor(logs, incremental=False) == expected
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+import core.vectorizer as vectorizer_module
+from core.vectorizer import Vectorizer
+
+
+class FakeVectorizer(Vectorizer):
+    # Вместо MiniLM — детерминированные случайные векторы по тексту; счётчик
+    # показывает, сколько текстов прошло бы через модель
+    computed = 0
+
+    def _compute_embeddings(self, texts, result, batch_tokens=None):
+        FakeVectorizer.computed += len(texts)
+        for i, text in enumerate(texts):
+            seed = int.from_bytes(text.encode('utf-8')[-8:].rjust(8, b'\0'), 'little')
+            result[i] = np.random.default_rng(seed).random(self.dimension, dtype=np.float32)
+        return result
+
+
+@pytest.fixture
+def make_vectorizer(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(vectorizer_module.AutoTokenizer, 'from_pretrained', lambda name: None)
+    monkeypatch.setattr(vectorizer_module.AutoModel, 'from_pretrained', lambda name: None)
+    monkeypatch.setenv('VECTOR_EMBED_CACHE', 'false')
+
+    def make(index_type):
+        monkeypatch.setenv('VECTOR_INDEX_TYPE', index_type)
+        return FakeVectorizer()
+    return make
+
+
+def texts(start, count):
+    return [f"analysis {i:08d}" for i in range(start, start + count)]
+
+
+def test_ivf_migrates_and_retrains_in_background(make_vectorizer):
+    vectorizer = make_vectorizer('ivf')
+    vectorizer.add_many(texts(0, 999))
+    assert vectorizer.index_kind(vectorizer.index) == 'flat'
+
+    vectorizer.add_many(texts(999, 1))
+    vectorizer.wait_for_migration()
+    assert vectorizer.index_kind(vectorizer.index) == 'ivf'
+    trained_nlist = vectorizer.index.nlist
+
+    # Вчетверо больше векторов — число кластеров растёт вслед за базой
+    vectorizer.add_many(texts(1000, 3000))
+    vectorizer.wait_for_migration()
+    assert vectorizer.index.ntotal == 4000
+    assert vectorizer.index.nlist >= 2 * trained_nlist
+
+    reopened = make_vectorizer('ivf')
+    assert reopened.index.nlist == vectorizer.index.nlist
+    assert reopened.index.ntotal == len(reopened.metadata) == 4000
+
+
+def test_ivfpq_retrain_uses_stored_vectors(make_vectorizer, monkeypatch):
+    # Меньше подпространств PQ — быстрее обучение кодбуков; при заданном nlist
+    # он ограничен числом векторов и удваивается уже при удвоении базы
+    monkeypatch.setenv('VECTOR_PQ_M', '8')
+    monkeypatch.setenv('VECTOR_IVF_NLIST', '512')
+    vectorizer = make_vectorizer('ivfpq')
+    vectorizer.add_many(texts(0, 39 * 256))
+    vectorizer.wait_for_migration()
+    assert vectorizer.index_kind(vectorizer.index) == 'ivfpq'
+    computed = FakeVectorizer.computed
+
+    assert vectorizer.index.nlist == 256
+
+    vectorizer.add_many(texts(39 * 256, 39 * 256))
+    vectorizer.wait_for_migration()
+    assert vectorizer.index.ntotal == 2 * 39 * 256
+    assert vectorizer.index.nlist == 512
+    # Переобучение не прогоняет историю через модель повторно
+    assert FakeVectorizer.computed - computed == 39 * 256
+
+
+def test_stored_vectors_follow_metadata(make_vectorizer, tmp_path):
+    vectorizer = make_vectorizer('flat')
+    vectorizer.add_many(texts(0, 10))
+    expected = vectorizer._stored_vectors(10)
+
+    # Хвост файла векторов без метаданных (сбой между записями) отрезается при запуске
+    with open(vectorizer._vectors_path(), 'ab') as f:
+        f.write(b'\0' * 100)
+    reopened = make_vectorizer('flat')
+    assert np.array_equal(reopened._stored_vectors(10), expected)
+
+    reopened.clear_db()
+    assert reopened._stored_vectors(0).shape == (0, reopened.dimension)
+    assert (tmp_path / "vector_db" / "vectors.f32").stat().st_size == 0
@@ -5,11 +5,13 @@ from PySide6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                             QMessageBox)
 from core.constants import logger
 from core.log_processor import LogProcessor
+from core.log_follower import LogFollower
 from core.llm_analyzer import LLMAnalyzer
+from core.log_buffer import LogBuffer
 from ui.settings_window import SettingsWindow
 from ui.loading_window import LoadingWindow
 from ui.styles import MAIN_STYLE, STATUS_BAR_STYLE
-from PySide6.QtGui import QFont
+from PySide6.QtGui import QFont, QTextCursor
 
 class MainWindow(QMainWindow):
     def __init__(self, vectorizer=None):
@@ -25,8 +27,11 @@ class MainWindow(QMainWindow):
         self.statusBar.setStyleSheet(STATUS_BAR_STYLE)
         self._setup_ui()
         self.setStyleSheet(MAIN_STYLE)
+        self.log_follower = None
+        self.follow_pending = None
         if not self.vectorizer:
             self.analyze_btn.setEnabled(False)
+            self.follow_btn.setEnabled(False)
             self.clear_db_btn.setEnabled(False)
             logger.debug("Vectorizer not initialized, buttons disabled")
         logger.debug("Main window initialized")
@@ -46,6 +51,11 @@ class MainWindow(QMainWindow):
         self.analyze_btn.clicked.connect(self.analyze_logs)
         self.analyze_btn.setEnabled(False)
         button_layout.addWidget(self.analyze_btn)
+        self.follow_btn = QPushButton("Follow")
+        self.follow_btn.setCheckable(True)
+        self.follow_btn.toggled.connect(self.toggle_follow)
+        self.follow_btn.setEnabled(False)
+        button_layout.addWidget(self.follow_btn)
         self.clear_db_btn = QPushButton("Clear DB")
         self.clear_db_btn.clicked.connect(self.clear_vector_db)
         button_layout.addWidget(self.clear_db_btn)
@@ -78,6 +88,7 @@ class MainWindow(QMainWindow):
                 return
             self.current_folder = folder_name
             self.analyze_btn.setEnabled(True)
+            self.follow_btn.setEnabled(self.vectorizer is not None)
             self.output_text.setText(f"Selected folder: {folder_name}")
             logger.debug(f"Folder selected for analysis: {folder_name}")
         except Exception as e:
@@ -97,6 +108,7 @@ class MainWindow(QMainWindow):
         
         self.select_folder_btn.setEnabled(False)
         self.analyze_btn.setEnabled(False)
+        self.follow_btn.setEnabled(False)
         self.clear_db_btn.setEnabled(False)
         
         self.progress_bar.setVisible(True)
@@ -105,9 +117,15 @@ class MainWindow(QMainWindow):
         self.statusBar.showMessage("Processing logs...")
         logger.debug(f"Starting log analysis from folder: {self.current_folder}")
         
+        if hasattr(self, 'processed_logs'):
+            self.processed_logs.close()
+            del self.processed_logs
+        self.preview_lines = 0
+        
         try:
             self.log_processor = LogProcessor(self.current_folder)
             self.log_processor.progress.connect(self.update_progress)
+            self.log_processor.chunk.connect(self.preview_chunk)
             self.log_processor.finished.connect(self.process_finished)
             self.log_processor.error.connect(self.process_error)
             self.log_processor.start()
@@ -120,17 +138,26 @@ class MainWindow(QMainWindow):
         self.output_text.append(message)
         self.statusBar.showMessage(message)
     
+    def preview_chunk(self, lines):
+        # Show the first lines as soon as they are parsed, the rest stays in the buffer
+        max_lines = 200
+        if self.preview_lines >= max_lines:
+            return
+        shown = lines[:max_lines - self.preview_lines]
+        self.preview_lines += len(shown)
+        self.output_text.append('\n'.join(shown))
+    
     def process_finished(self, processed_logs):
         logger.debug("Log processing finished, starting LLM analysis")
+        if isinstance(processed_logs, str):
+            processed_logs = LogBuffer.from_text(processed_logs)
         self.processed_logs = processed_logs
         max_lines = 200
-        lines = processed_logs.split('\n')
-        total_lines = len(lines)
+        total_lines = processed_logs.line_count
         lines_info = f"[Total log lines: {total_lines}]"
+        displayed_logs = '\n'.join(processed_logs.head(max_lines))
         if total_lines > max_lines:
-            displayed_logs = '\n'.join(lines[:max_lines]) + f"\n\n[...hidden {total_lines - max_lines} lines...]"
-        else:
-            displayed_logs = processed_logs
+            displayed_logs += f"\n\n[...hidden {total_lines - max_lines} lines...]"
         html_content = f"""
         <!DOCTYPE html>
         <html>
@@ -161,6 +188,9 @@ class MainWindow(QMainWindow):
                 processed_logs,
                 self.vectorizer
             )
+            self.llm_analyzer.progress.connect(self.statusBar.showMessage)
+            self.llm_analyzer.token.connect(self.analysis_token)
+            self.streamed_tokens = 0
             self.llm_analyzer.finished.connect(self.analysis_finished)
             self.llm_analyzer.error.connect(self.analysis_error)
             logger.debug(f"LLM analyzer created, URL: {self.api_url}, API key length: {len(self.api_key) if self.api_key else 0}")
@@ -170,13 +200,24 @@ class MainWindow(QMainWindow):
             logger.error(f"Error creating LLM analyzer: {str(e)}", exc_info=True)
             self.analysis_error(f"Error creating LLM analyzer: {str(e)}")
     
-    def analysis_finished(self, analysis):
+    def analysis_token(self, token):
+        # Render the response progressively; the final Markdown rendering replaces it
+        if not self.streamed_tokens:
+            self.output_text.append("<div class='analysis-header'><b>LLM Analysis Results</b></div>")
+            self.output_text.append("")
+            self.statusBar.showMessage("Receiving LLM response...")
+        self.streamed_tokens += 1
+        cursor = self.output_text.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(token)
+        self.output_text.setTextCursor(cursor)
+        self.output_text.ensureCursorVisible()
+    
+    def analysis_finished(self, analysis, from_cache=False):
         logger.debug(f"LLM analysis result received, length: {len(analysis) if analysis else 0}")
         logger.debug(f"Result start: {analysis[:100] if analysis else 'empty'}")
         self.progress_bar.setVisible(False)
-        self.select_folder_btn.setEnabled(True)
-        self.analyze_btn.setEnabled(True)
-        self.clear_db_btn.setEnabled(True)
+        self._restore_buttons()
         original_analysis = analysis
         if analysis:
             try:
@@ -208,7 +249,7 @@ class MainWindow(QMainWindow):
                 analysis = original_analysis.replace('\n', '<br>')
         logs_info = ""
         if hasattr(self, 'processed_logs'):
-            total_lines = len(self.processed_logs.split('\n'))
+            total_lines = self.processed_logs.line_count
             logs_info = f"<div class='logs-summary'>Processed {total_lines} log lines</div>"
         html_content = f"""
         <!DOCTYPE html>
@@ -251,7 +292,7 @@ class MainWindow(QMainWindow):
             <div class="logs-container">
                 {logs_info}
                 <div class="logs-toggle" id="logs-toggle" onclick="toggleLogs()">▶ Show logs</div>
-                <pre class="logs-content" id="logs-content">{self.processed_logs[:5000] if hasattr(self, 'processed_logs') else ""}</pre>
+                <pre class="logs-content" id="logs-content">{self.processed_logs.head_text(5000) if hasattr(self, 'processed_logs') else ""}</pre>
             </div>
             <div class="analysis-header">LLM Analysis Results</div>
             <div class="analysis-content">{analysis}</div>
@@ -261,28 +302,97 @@ class MainWindow(QMainWindow):
         self.output_text.clear()
         self.output_text.setHtml(html_content)
         try:
-            self.vectorizer.add_to_db(original_analysis)
+            # A cached answer was already stored when it was first produced
+            if not from_cache:
+                self.vectorizer.add_to_db(original_analysis)
         except Exception as e:
             logger.error(f"Error saving result to database: {str(e)}", exc_info=True)
             QMessageBox.warning(self, "Warning", f"Failed to save result to database: {str(e)}")
         self.statusBar.showMessage("Analysis complete")
+        self._start_pending_follow_analysis()
+    
+    def _restore_buttons(self):
+        following = self.log_follower is not None
+        self.select_folder_btn.setEnabled(not following)
+        self.analyze_btn.setEnabled(not following)
+        self.follow_btn.setEnabled(True)
+        self.clear_db_btn.setEnabled(True)
     
     def process_error(self, error_message):
         self.progress_bar.setVisible(False)
-        self.select_folder_btn.setEnabled(True)
-        self.analyze_btn.setEnabled(True)
-        self.clear_db_btn.setEnabled(True)
+        self._restore_buttons()
         QMessageBox.critical(self, "Error", error_message)
         self.statusBar.showMessage("Processing error")
     
     def analysis_error(self, error_message):
         self.progress_bar.setVisible(False)
-        self.select_folder_btn.setEnabled(True)
-        self.analyze_btn.setEnabled(True)
-        self.clear_db_btn.setEnabled(True)
+        self._restore_buttons()
+        if self.log_follower is not None:
+            # Do not block a long-running follow session with modal dialogs
+            logger.error(f"Follow mode analysis error: {error_message}")
+            self.statusBar.showMessage(f"Analysis error: {error_message}")
+            self._start_pending_follow_analysis()
+            return
         QMessageBox.critical(self, "Error", error_message)
         self.statusBar.showMessage("Analysis error")
     
+    def toggle_follow(self, enabled):
+        if enabled:
+            if not hasattr(self, 'current_folder') or self.vectorizer is None:
+                self.follow_btn.setChecked(False)
+                return
+            logger.debug(f"Starting follow mode for folder: {self.current_folder}")
+            self.log_follower = LogFollower(self.current_folder, self)
+            self.log_follower.status.connect(self.statusBar.showMessage)
+            self.log_follower.anomalies.connect(self.follow_anomalies)
+            self.follow_btn.setText("Stop following")
+            self.select_folder_btn.setEnabled(False)
+            self.analyze_btn.setEnabled(False)
+            self.log_follower.start()
+        else:
+            logger.debug("Stopping follow mode")
+            if self.log_follower is not None:
+                self.log_follower.stop()
+                self.log_follower = None
+            if self.follow_pending is not None:
+                self.follow_pending.close()
+                self.follow_pending = None
+            self.follow_btn.setText("Follow")
+            if not self._analysis_running():
+                self._restore_buttons()
+            self.statusBar.showMessage("Follow mode stopped")
+    
+    def _analysis_running(self):
+        processing = hasattr(self, 'log_processor') and self.log_processor.isRunning()
+        analyzing = hasattr(self, 'llm_analyzer') and self.llm_analyzer.isRunning()
+        return processing or analyzing
+    
+    def follow_anomalies(self, buffer):
+        # New anomalous windows arrive while an analysis may still be running: keep them for the next one
+        if self._analysis_running():
+            if self.follow_pending is None:
+                self.follow_pending = LogBuffer()
+            self.follow_pending.append(list(buffer.iter_lines()))
+            buffer.close()
+            return
+        self._start_follow_analysis(buffer)
+    
+    def _start_pending_follow_analysis(self):
+        if self.log_follower is None or self.follow_pending is None:
+            return
+        buffer = self.follow_pending
+        self.follow_pending = None
+        self._start_follow_analysis(buffer)
+    
+    def _start_follow_analysis(self, buffer):
+        logger.debug(f"Follow mode: analyzing {buffer.line_count} new anomalous lines")
+        self.clear_db_btn.setEnabled(False)
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setRange(0, 0)
+        if hasattr(self, 'processed_logs'):
+            self.processed_logs.close()
+        self.process_finished(buffer)
+    
     def clear_vector_db(self):
         reply = QMessageBox.question(
             self,
@@ -338,6 +448,7 @@ class MainWindow(QMainWindow):
             self.clear_db_btn.setEnabled(True)
             if hasattr(self, 'current_folder') and os.path.exists(self.current_folder):
                 self.analyze_btn.setEnabled(True)
+                self.follow_btn.setEnabled(True)
                 logger.debug("Analyze button activated")
             return True
         except Exception as e:
@@ -195,6 +195,16 @@ class SettingsWindow(QDialog):
         self.parent().api_url = url
         self.parent().api_key = api_key
         
+        # Keep options that are not edited in this window (processing limits etc.)
+        managed_keys = {'LLM_URL', 'API_KEY', 'LLM_PROMPT', 'LLM_TEMPERATURE', 'LLM_MAX_TOKENS', 'APP_LANG'}
+        extra_lines = []
+        if os.path.exists('.env'):
+            with open('.env', 'r', encoding='utf-8') as f:
+                for line in f:
+                    key = line.split('=', 1)[0].strip()
+                    if line.strip() and key not in managed_keys:
+                        extra_lines.append(line.rstrip('\n'))
+        
         # Save to .env file
         try:
             with open('.env', 'w', encoding='utf-8') as f:
@@ -206,6 +216,8 @@ class SettingsWindow(QDialog):
                 f.write(f"LLM_TEMPERATURE={temperature}\n")
                 f.write(f"LLM_MAX_TOKENS={max_tokens}\n")
                 f.write(f"APP_LANG={lang}\n")
+                for line in extra_lines:
+                    f.write(f"{line}\n")
             
             logger.debug(f"Settings saved. URL: {url}, API key length: {len(api_key) if api_key else 0}, prompt length: {len(prompt)}, temp: {temperature}, max_tokens: {max_tokens}, lang: {lang}")
             